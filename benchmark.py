@@ -0,0 +1,316 @@
+"""
+Reproducible search benchmark. Generates a deterministic synthetic tree (small source files,
+a few huge logs, excluded folders and sample Office/PDF documents), times SearchEngine.search
+in several modes and compares the numbers against a stored JSON baseline.
+
+    python benchmark.py --save-baseline bench_baseline.json
+    python benchmark.py --compare bench_baseline.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource # Not available on Windows; peak RSS is then reported as None
+except ImportError:
+    resource = None
+
+WORDS = ("alpha beta gamma delta value result config buffer stream handler request response "
+         "session client server worker thread queue index cache token parser lexer render "
+         "update status error warning retry socket packet connection timeout offset").split()
+EXCLUDED_DIRS = ('node_modules', '.git', '__pycache__', 'build')
+CORPUS_VERSION = 2
+
+# name -> search() keyword arguments
+SCENARIOS = {
+    'fuzzy': dict(query="conection timout", threshold=80),
+    'regex': dict(query=r"timeout after \d+ms", use_regex=True),
+    'case_sensitive': dict(query="ConnectionTimeout", threshold=80, case_sensitive=True),
+    'office': dict(query="quarterly revenue", threshold=80, search_office=True),
+    'large_files': dict(query=r"ERROR .* id=4242\b", use_regex=True, large_files=True),
+}
+
+
+def _sentence(rng, words=8):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def _source_file(rng, lines):
+    out = []
+    for i in range(lines):
+        roll = rng.random()
+        if roll < 0.01:
+            out.append(f"    raise ConnectionTimeout('timeout after {rng.randint(10, 5000)}ms')")
+        elif roll < 0.02:
+            out.append(f"    # connection timeout while {_sentence(rng, 3)}")
+        elif roll < 0.15:
+            out.append(f"def {rng.choice(WORDS)}_{rng.choice(WORDS)}_{i}({rng.choice(WORDS)}):")
+        else:
+            out.append(f"    {rng.choice(WORDS)} = {_sentence(rng, rng.randint(2, 10))}")
+    return "\n".join(out) + "\n"
+
+
+def _write_log(path, rng, size):
+    levels = ["INFO"] * 8 + ["WARN", "ERROR"]
+    block = []
+    for i in range(2000):
+        level = rng.choice(levels)
+        block.append(f"2026-01-01 12:{i // 60 % 60:02d}:{i % 60:02d} {level} {_sentence(rng, 6)} id={rng.randint(0, 9999)}\n")
+    # One known needle per block for the large-file scenario
+    block[1000] = "2026-01-01 12:16:40 ERROR request failed after retries id=4242\n"
+    data = "".join(block).encode('utf-8')
+    with open(path, 'wb') as f:
+        written = 0
+        while written < size:
+            f.write(data)
+            written += len(data)
+
+
+def _write_pdf(path, pages):
+    """Writes a minimal text PDF by hand (one Helvetica text block per page)."""
+    objects = []
+    page_ids = [3 + 2 * i for i in range(len(pages))]
+    font_id = 3 + 2 * len(pages)
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    kids = " ".join(f"{pid} 0 R" for pid in page_ids)
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>".encode())
+    for pid, lines in zip(page_ids, pages):
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {pid + 1} 0 R "
+                       f"/Resources << /Font << /F1 {font_id} 0 R >> >> >>".encode())
+        text = " ".join(f"({line}) Tj 0 -14 Td" for line in lines)
+        stream = f"BT /F1 11 Tf 72 740 Td {text} ET".encode('latin-1')
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, 'wb') as f:
+        f.write(out)
+
+
+def _office_lines(rng, count):
+    lines = [_sentence(rng, 7) for _ in range(count)]
+    for i in range(0, count, 25):
+        lines[i] = f"Q{rng.randint(1, 4)} quarterly revenue grew by {rng.randint(1, 40)} percent"
+    return lines
+
+
+def generate_corpus(root, small_files=2000, logs=2, log_mb=16, documents=6, seed=1234):
+    """
+    Builds the synthetic tree under root unless an identical one is already there.
+    Returns the corpus manifest (parameters and byte counts per kind of file).
+    """
+    params = {'version': CORPUS_VERSION, 'small_files': small_files, 'logs': logs, 'log_mb': log_mb,
+              'documents': documents, 'seed': seed}
+    manifest_path = os.path.join(root, 'corpus.json')
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get('params') == params:
+            return manifest
+    except (OSError, ValueError):
+        pass
+
+    shutil.rmtree(root, ignore_errors=True)
+    rng = random.Random(seed)
+    stats = {'text_files': 0, 'text_bytes': 0, 'log_bytes': 0, 'office_files': 0, 'office_bytes': 0}
+
+    # 1. Many small source files in a nested package layout
+    for i in range(small_files):
+        folder = os.path.join(root, 'src', f"pkg{i % 20}", f"mod{i % 7}")
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"file_{i}.py")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(_source_file(rng, rng.randint(20, 400)))
+        stats['text_files'] += 1
+        stats['text_bytes'] += os.path.getsize(path)
+
+    # 2. Excluded folders full of matching files that must never be scanned
+    for name in EXCLUDED_DIRS:
+        folder = os.path.join(root, 'src', 'pkg0', name, 'nested')
+        os.makedirs(folder, exist_ok=True)
+        for i in range(50):
+            with open(os.path.join(folder, f"skip_{i}.py"), 'w', encoding='utf-8') as f:
+                f.write(_source_file(rng, 100))
+
+    # 3. A few huge logs, only searched in large-file mode
+    os.makedirs(os.path.join(root, 'logs'), exist_ok=True)
+    for i in range(logs):
+        path = os.path.join(root, 'logs', f"service_{i}.log")
+        _write_log(path, rng, log_mb * 1024 * 1024)
+        stats['log_bytes'] += os.path.getsize(path)
+
+    # 4. Office and PDF samples
+    from docx import Document
+    from openpyxl import Workbook
+    folder = os.path.join(root, 'docs')
+    os.makedirs(folder, exist_ok=True)
+    for i in range(documents):
+        document = Document()
+        for line in _office_lines(rng, 300):
+            document.add_paragraph(line)
+        document.save(os.path.join(folder, f"report_{i}.docx"))
+
+        workbook = Workbook()
+        sheet = workbook.active
+        for row, line in enumerate(_office_lines(rng, 300), 1):
+            sheet.cell(row=row, column=1, value=line)
+            sheet.cell(row=row, column=2, value=rng.randint(0, 100000))
+        workbook.save(os.path.join(folder, f"figures_{i}.xlsx"))
+
+        _write_pdf(os.path.join(folder, f"summary_{i}.pdf"), [_office_lines(rng, 40) for _ in range(10)])
+    for name in os.listdir(folder):
+        stats['office_files'] += 1
+        stats['office_bytes'] += os.path.getsize(os.path.join(folder, name))
+
+    manifest = {'params': params, 'stats': stats}
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak = max(peak, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_scenario(root, name, workers):
+    """Runs one scenario with a cold cache and returns its measurements. Meant for a fresh process."""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from search_engine import SearchEngine
+
+    kwargs = dict(SCENARIOS[name])
+    query = kwargs.pop('query')
+    finished = []
+    with tempfile.TemporaryDirectory() as cache_dir:
+        engine = SearchEngine(cache_dir)
+        started = time.perf_counter()
+        first_result = None
+        results = 0
+        matches = 0
+        for result in engine.search(root, query, update_callback=finished.append, workers=workers, **kwargs):
+            if first_result is None:
+                first_result = time.perf_counter() - started
+            results += 1
+            matches += len(result['matches'])
+        elapsed = time.perf_counter() - started
+
+    files = finished[-1][1] if finished and finished[-1][0] == "Finished" else 0
+    return {
+        'elapsed_s': round(elapsed, 4),
+        'first_result_s': round(first_result, 4) if first_result is not None else None,
+        'files': files,
+        'results': results,
+        'matches': matches,
+        'files_per_s': round(files / elapsed, 1),
+        'peak_rss_mb': _peak_rss_mb(),
+    }
+
+
+def measure(root, manifest, names, workers, repeat):
+    stats = manifest['stats']
+    context = multiprocessing.get_context('spawn')
+    report = {}
+    for name in names:
+        runs = []
+        for _ in range(repeat):
+            # A fresh process per run keeps peak RSS and warm caches from leaking between runs
+            # Executor workers are not daemonic, so the engine can start its extraction processes
+            with ProcessPoolExecutor(1, mp_context=context) as pool:
+                runs.append(pool.submit(run_scenario, root, name, workers).result())
+        best = min(runs, key=lambda r: r['elapsed_s'])
+        scanned = stats['text_bytes']
+        if SCENARIOS[name].get('search_office'):
+            scanned += stats['office_bytes']
+        if SCENARIOS[name].get('large_files'):
+            scanned += stats['log_bytes']
+        best['mb_per_s'] = round(scanned / (1024 * 1024) / best['elapsed_s'], 1)
+        report[name] = best
+        print(f"{name:15} {best['elapsed_s']:8.3f}s  first {best['first_result_s'] or 0:6.3f}s  "
+              f"{best['files_per_s']:9.1f} files/s  {best['mb_per_s']:7.1f} MB/s  "
+              f"{best['results']:5} files  peak {best['peak_rss_mb']} MB")
+    return report
+
+
+def compare(report, baseline, tolerance):
+    """Returns the list of regressions of report against baseline."""
+    failures = []
+    for name, current in report.items():
+        old = baseline.get('scenarios', {}).get(name)
+        if old is None:
+            continue
+        # Result counts must match exactly: a faster but different answer is a regression too
+        for key in ('results', 'matches'):
+            if current[key] != old[key]:
+                failures.append(f"{name}: {key} changed from {old[key]} to {current[key]}")
+        if current['elapsed_s'] > old['elapsed_s'] * (1 + tolerance):
+            failures.append(f"{name}: {current['elapsed_s']}s vs baseline {old['elapsed_s']}s")
+        if current['first_result_s'] and old['first_result_s'] and \
+                current['first_result_s'] > max(old['first_result_s'] * (1 + tolerance), 0.05):
+            failures.append(f"{name}: first result {current['first_result_s']}s vs baseline {old['first_result_s']}s")
+        if current['peak_rss_mb'] and old['peak_rss_mb'] and current['peak_rss_mb'] > old['peak_rss_mb'] * (1 + tolerance):
+            failures.append(f"{name}: peak RSS {current['peak_rss_mb']} MB vs baseline {old['peak_rss_mb']} MB")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark SearchEngine.search on a synthetic corpus.")
+    parser.add_argument("--corpus", default=os.path.join(tempfile.gettempdir(), 'grapper-bench'), help="Where the corpus is generated")
+    parser.add_argument("--small-files", type=int, default=2000)
+    parser.add_argument("--logs", type=int, default=2)
+    parser.add_argument("--log-mb", type=int, default=16)
+    parser.add_argument("--documents", type=int, default=6)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="Run only these scenarios")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per scenario; the fastest is kept")
+    parser.add_argument("--save-baseline", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Compare against this JSON baseline and exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown before failing (default: 0.25)")
+    args = parser.parse_args(argv)
+
+    print(f"Generating corpus in {args.corpus} ...")
+    manifest = generate_corpus(args.corpus, args.small_files, args.logs, args.log_mb, args.documents, args.seed)
+    report = measure(args.corpus, manifest, args.scenario or list(SCENARIOS), args.workers, args.repeat)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'corpus': manifest, 'workers': args.workers, 'scenarios': report}, f, indent=2)
+        print(f"Baseline written to {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get('corpus', {}).get('params') != manifest['params']:
+            print("Baseline was recorded on a different corpus; regenerate it with the same options.")
+            return 2
+        failures = compare(report, baseline, args.tolerance)
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        if failures:
+            return 1
+        print("No regressions.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,164 @@
+"""
+Headless command-line entry point: searches a directory with SearchEngine and streams
+each result as a JSON line on stdout. Deliberately free of PyQt6 and Pygments imports.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import multiprocessing
+
+from search_engine import SearchEngine, DEFAULT_LARGE_FILE_THRESHOLD, page_number, match_location
+from result_cache import ResultCache
+from scan_scheduler import SCAN_ORDERS
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="grapper", description="Fuzzy and regex search over a directory tree, printed as JSON Lines.")
+    parser.add_argument("directory", help="Directory to search")
+    parser.add_argument("query", help="Search query (fuzzy by default, a pattern with --regex)")
+    parser.add_argument("-t", "--threshold", type=int, default=60, help="Minimum fuzzy score, 0-100 (default: 60)")
+    parser.add_argument("-r", "--regex", action="store_true", help="Treat the query as a regular expression")
+    parser.add_argument("-m", "--multiline", action="store_true", help="Let regex matches span lines")
+    parser.add_argument("-c", "--case-sensitive", action="store_true", help="Match case")
+    parser.add_argument("-o", "--office", action="store_true", help="Also search .docx, .xlsx and .pdf documents")
+    parser.add_argument("-l", "--limit-per-file", type=int, default=0, help="Matches kept per file, 0 = unlimited")
+    parser.add_argument("-j", "--workers", type=int, default=1, help="Number of search processes (default: 1)")
+    parser.add_argument("--io-threads", type=int, default=0,
+                        help="Threads that read files ahead of the matcher, 0 = read inline (try 4-16 on network drives)")
+    parser.add_argument("-n", "--max-results", type=int, default=0, help="Stop after this many matching files, 0 = unlimited")
+    parser.add_argument("-k", "--top-k", type=int, default=0, help="Print only the best K files, best first, 0 = all")
+    parser.add_argument("-g", "--include", action="append", default=[], metavar="GLOB",
+                        help="Only search files matching this glob; repeatable")
+    parser.add_argument("-x", "--exclude", action="append", default=[], metavar="GLOB",
+                        help="Skip files and folders matching this gitignore-style glob; repeatable")
+    parser.add_argument("--gitignore", action="store_true", help="Honor .gitignore and .ignore files in the tree")
+    parser.add_argument("--order", choices=SCAN_ORDERS, default="walk",
+                        help="Search recently modified or smallest files first (default: walk, i.e. folder order)")
+    parser.add_argument("--pin", metavar="FOLDER", help="Search this subfolder before the rest of the tree")
+    parser.add_argument("--extract-timeout", type=float, default=SearchEngine.extraction_timeout,
+                        help="Seconds before an Office/PDF extraction is abandoned and reported (default: 30)")
+    parser.add_argument("--extract-memory-mb", type=int, default=SearchEngine.extraction_memory_mb,
+                        help="Memory cap of each extraction process in MB (default: 1024)")
+    parser.add_argument("--index", action="store_true", help="Use the persistent trigram index")
+    parser.add_argument("--cache", action="store_true", help="Reuse cached results of an identical earlier search")
+    parser.add_argument("--large-files", action="store_true", help="Memory-map and search files over the size limit")
+    parser.add_argument("--large-file-mb", type=float, default=DEFAULT_LARGE_FILE_THRESHOLD / (1024 * 1024),
+                        help="Size limit in MB for normal reads (default: 1)")
+    parser.add_argument("--no-fuzzy-batch", action="store_true", help="Score fuzzy matches file by file instead of in batches")
+    parser.add_argument("--cache-dir", help="Directory for the index and caches (default: per-user cache dir)")
+    parser.add_argument("--timing", action="store_true", help="Print a timing summary as JSON on stderr")
+    parser.add_argument("--stats", action="store_true", help="Add per-phase times, bytes read, skip reasons and the slowest files to the timing summary")
+    return parser
+
+
+def result_to_json(result):
+    """Flattens a result dict into JSON-friendly form with 1-based line (and PDF page) numbers and document locations."""
+    if 'error' in result:
+        return {'path': result['path'], 'filename': result['filename'], 'error': result['error']}
+    matches = []
+    for match in result['matches']:
+        item = {'line': match[0].rstrip('\r\n'), 'score': match[1], 'line_number': match[2] + 1}
+        if len(match) > 3 and isinstance(match[3], tuple):
+            item['span'] = list(match[3])
+        page = page_number(result, match[2])
+        if page is not None:
+            item['page'] = page
+        location = match_location(result, match)
+        if location is not None:
+            item['location'] = location
+        matches.append(item)
+    return {'path': result['path'], 'filename': result['filename'], 'score': result['score'], 'matches': matches}
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    engine = SearchEngine(args.cache_dir)
+    engine.extraction_timeout = args.extract_timeout
+    engine.extraction_memory_mb = args.extract_memory_mb
+    if args.cache:
+        # Same on-disk cache as the GUI, so repeated pipeline runs can reuse it
+        engine.result_cache = ResultCache(os.path.join(engine.cache_dir, 'results.pickle'))
+    stop_event = threading.Event()
+    files_scanned = 0
+    queue_peaks = {}
+
+    def on_progress(update):
+        nonlocal files_scanned
+        tag, current, total = update
+        if tag in ("Progress", "Finished"):
+            files_scanned = current
+        elif tag == "Queues":
+            for stage, depth in total.items():
+                queue_peaks[stage] = max(queue_peaks.get(stage, 0), depth)
+
+    started = time.perf_counter()
+    first_result = None
+    count = 0
+    results = engine.search(
+        args.directory,
+        args.query,
+        stop_event=stop_event,
+        threshold=args.threshold,
+        update_callback=on_progress,
+        use_regex=args.regex,
+        search_office=args.office,
+        case_sensitive=args.case_sensitive,
+        limit_per_file=args.limit_per_file,
+        use_index=args.index,
+        workers=args.workers,
+        multiline=args.multiline,
+        large_files=args.large_files,
+        large_file_threshold=int(args.large_file_mb * 1024 * 1024),
+        fuzzy_batch=not args.no_fuzzy_batch,
+        use_cache=args.cache,
+        collect_stats=args.stats,
+        top_k=args.top_k,
+        max_results=args.max_results,
+        include_globs=args.include,
+        exclude_globs=args.exclude,
+        use_ignore_files=args.gitignore,
+        scan_order=args.order,
+        pinned_folder=args.pin,
+        io_threads=args.io_threads
+    )
+    try:
+        for result in results:
+            if first_result is None:
+                first_result = time.perf_counter() - started
+            sys.stdout.write(json.dumps(result_to_json(result), ensure_ascii=False) + "\n")
+            sys.stdout.flush()
+            count += 1
+    except BrokenPipeError:
+        # The reader (e.g. `head`) went away; stop quietly and keep the final flush from failing
+        stop_event.set()
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    except KeyboardInterrupt:
+        stop_event.set()
+        return 130
+    finally:
+        results.close()
+
+    if args.timing or args.stats:
+        elapsed = time.perf_counter() - started
+        summary = {
+            'elapsed_s': round(elapsed, 4),
+            'first_result_s': round(first_result, 4) if first_result is not None else None,
+            'results': count,
+            'files_scanned': files_scanned,
+            'files_per_s': round(files_scanned / elapsed, 1) if elapsed > 0 else None,
+        }
+        if queue_peaks:
+            summary['queue_peaks'] = queue_peaks
+        if args.stats and engine.last_stats:
+            summary['stats'] = engine.last_stats
+        print(json.dumps(summary), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    # Required for the search process pool in frozen (PyInstaller) builds
+    multiprocessing.freeze_support()
+    sys.exit(main())
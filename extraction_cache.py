@@ -0,0 +1,91 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+
+
+class ExtractionCache:
+    """
+    Persistent cache of text extracted from Office and PDF documents.
+    Entries are keyed by (path, size, mtime), stored as zlib-compressed JSON line lists
+    (with the layout of the document's blocks: pages, sheets, locations), and evicted least-recently-used first once the cache grows past max_bytes.
+    """
+
+    def __init__(self, cache_dir, max_bytes=256 * 1024 * 1024):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.db_path = os.path.join(cache_dir, 'extraction.sqlite')
+        self.max_bytes = max_bytes
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, "
+                "last_used REAL, nbytes INTEGER, data BLOB)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+
+    def _connect(self):
+        # A fresh connection per call keeps the cache usable from the GUI thread,
+        # the search thread and pool processes alike.
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def get_layout(self, filepath, st):
+        """Returns (lines, layout) for filepath, or None if it is not cached (or cached without a layout by an older version)."""
+        data = self._load(filepath, st)
+        if isinstance(data, dict) and 'layout' in data:
+            return data['lines'], data['layout']
+        return None
+
+    def _load(self, filepath, st):
+        try:
+            conn = self._connect()
+        except sqlite3.Error:
+            return None
+        try:
+            with conn:
+                row = conn.execute(
+                    "SELECT data FROM entries WHERE path = ? AND size = ? AND mtime_ns = ?",
+                    (filepath, st.st_size, st.st_mtime_ns)
+                ).fetchone()
+                if row is None:
+                    return None
+                conn.execute("UPDATE entries SET last_used = ? WHERE path = ?", (time.time(), filepath))
+            return json.loads(zlib.decompress(row[0]).decode('utf-8'))
+        except (sqlite3.Error, zlib.error, ValueError) as e:
+            print(f"Error reading extraction cache: {e}")
+            return None
+        finally:
+            conn.close()
+
+    def put(self, filepath, st, lines, layout):
+        """Stores the extracted lines and layout for filepath and evicts old entries if over the size cap."""
+        entry = {'lines': lines, 'layout': layout}
+        data = zlib.compress(json.dumps(entry, ensure_ascii=False).encode('utf-8'))
+        if len(data) > self.max_bytes:
+            return
+        try:
+            conn = self._connect()
+        except sqlite3.Error:
+            return
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (path, size, mtime_ns, last_used, nbytes, data) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (filepath, st.st_size, st.st_mtime_ns, time.time(), len(data), data)
+                )
+                self._evict(conn)
+        except sqlite3.Error as e:
+            print(f"Error writing extraction cache: {e}")
+        finally:
+            conn.close()
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for path, nbytes in conn.execute("SELECT path, nbytes FROM entries ORDER BY last_used").fetchall():
+            conn.execute("DELETE FROM entries WHERE path = ?", (path,))
+            total -= nbytes
+            if total <= self.max_bytes:
+                break
@@ -0,0 +1,230 @@
+import time
+import threading
+import multiprocessing
+from multiprocessing.connection import wait
+
+try:
+    import resource # POSIX only: caps the address space of each extraction process
+except ImportError:
+    resource = None
+
+
+class ExtractionError(Exception):
+    """A document extraction that was abandoned: it timed out, hit the memory cap or crashed its process."""
+
+
+def _worker_main(conn, extract, memory_limit_mb):
+    """
+    Loop of an extraction process. Receives (path, args) requests for the generator function extract
+    and sends each item it yields as ('item', item), then ('ok', None); a failed stream ends with
+    ('memory', None) or ('error', message) instead. A 'stop' message ends the stream early.
+    """
+    if resource is not None and memory_limit_mb:
+        limit = memory_limit_mb * 1024 * 1024
+        try:
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ValueError, OSError):
+            pass
+    # Start-up (a spawned interpreter re-imports the app) does not count against the timeout
+    conn.send(('ready', None))
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            return
+        if request is None:
+            return
+        if request == 'stop':
+            continue # Arrived after its stream had already ended
+        filepath, args = request
+        try:
+            items = extract(filepath, *args)
+            for item in items:
+                conn.send(('item', item))
+                if conn.poll():
+                    conn.recv() # 'stop'
+                    items.close()
+                    break
+            conn.send(('ok', None))
+        except MemoryError:
+            conn.send(('memory', None))
+        except Exception as e:
+            conn.send(('error', str(e)))
+
+
+class ExtractionPool:
+    """
+    Runs a streaming document extractor in a few long-lived worker processes, so a broken or huge
+    document cannot hang or bloat the calling process. Each file gets a timeout and each process a
+    memory cap; a worker that times out, crashes or is cancelled through stop_event is killed and
+    replaced on the next call. extract must be a picklable module-level generator function
+    (workers are spawned).
+    """
+
+    # Seconds a new worker may take to import the app before it is given up on
+    start_timeout = 60
+
+    def __init__(self, extract, workers=2, timeout=30, memory_limit_mb=1024):
+        self.extract = extract
+        self.workers = workers
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        # Spawned rather than forked: the GUI and the search pipeline run threads
+        self.context = multiprocessing.get_context('spawn')
+        self.slots = threading.BoundedSemaphore(workers)
+        # A preview gets a process of its own rather than queueing behind a search's extractions
+        self.preview_slot = threading.BoundedSemaphore(1)
+        self.idle = []
+        self.lock = threading.Lock()
+
+    def _start(self):
+        parent_conn, child_conn = self.context.Pipe()
+        process = self.context.Process(target=_worker_main, args=(child_conn, self.extract, self.memory_limit_mb), daemon=True)
+        process.start()
+        child_conn.close()
+        return process, parent_conn
+
+    @staticmethod
+    def _kill(worker):
+        process, conn = worker
+        process.kill()
+        process.join(1)
+        conn.close()
+
+    def _wait_ready(self, conn, stop_event):
+        """Waits for a new worker's ready message; returns False if stop_event was set first."""
+        deadline = time.monotonic() + self.start_timeout
+        while not conn.poll(0.05):
+            if stop_event is not None and stop_event.is_set():
+                return False
+            if time.monotonic() > deadline:
+                raise ExtractionError("Extraction process did not start")
+        try:
+            conn.recv()
+        except (EOFError, OSError):
+            raise ExtractionError("Extraction process crashed")
+        return True
+
+    def _checkout(self, stop_event):
+        """Takes an idle worker or starts one (the caller holds a slot); None if stop_event was set meanwhile."""
+        with self.lock:
+            worker = self.idle.pop() if self.idle else None
+        if worker is not None:
+            return worker
+        worker = self._start()
+        try:
+            if self._wait_ready(worker[1], stop_event):
+                return worker
+        except ExtractionError:
+            self._kill(worker)
+            raise
+        self._kill(worker)
+        return None
+
+    def _checkin(self, worker, healthy):
+        if healthy:
+            with self.lock:
+                self.idle.append(worker)
+        else:
+            self._kill(worker)
+
+    @staticmethod
+    def _send(conn, message):
+        try:
+            conn.send(message)
+        except OSError:
+            raise ExtractionError("Extraction process crashed")
+
+    def _receive(self, conn, filepath):
+        """Reads one reply as (status, value); raises ExtractionError for the memory cap or a crash."""
+        try:
+            status, value = conn.recv()
+        except (EOFError, OSError):
+            raise ExtractionError("Extraction process crashed")
+        if status == 'memory':
+            raise ExtractionError(f"Extraction exceeded the {self.memory_limit_mb} MB memory cap")
+        if status == 'error':
+            print(f"Error extracting {filepath}: {value}")
+        return status, value
+
+    def stream(self, filepath, stop_event=None, timeout=None, parts=1, preview=False):
+        """
+        Yields the (index, item) pairs of a generator extractor in index order. extract(filepath, part, parts)
+        must yield (index, item) for the indexes i with i % parts == part, so up to `parts` idle
+        slots split one document between their workers (one slot is always waited for).
+        Closing the generator early stops the workers after their current item, and setting
+        stop_event kills them. The timeout covers the whole file (self.timeout unless given).
+        Raises ExtractionError on a timeout, the memory cap or a crashed worker; the items a
+        worker did not deliver because of an extraction error are skipped.
+        With preview, the stream takes the single preview slot instead, which no search waits on.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        slots = self.preview_slot if preview else self.slots
+        slots.acquire()
+        held = 1
+        while held < parts and slots.acquire(blocking=False):
+            held += 1
+        workers = []
+        finished = set()
+        failed = False
+        try:
+            for _ in range(held):
+                worker = self._checkout(stop_event)
+                if worker is None:
+                    return
+                workers.append(worker)
+            deadline = time.monotonic() + timeout
+            active = {}
+            for part, worker in enumerate(workers):
+                self._send(worker[1], (filepath, (part, len(workers))))
+                active[worker[1]] = part
+            pending = {}
+            next_index = 0
+            while active:
+                while next_index in pending:
+                    yield next_index, pending.pop(next_index)
+                    next_index += 1
+                if stop_event is not None and stop_event.is_set():
+                    return
+                if time.monotonic() > deadline:
+                    raise ExtractionError(f"Extraction timed out after {timeout:g} s")
+                for conn in wait(list(active), 0.05):
+                    status, value = self._receive(conn, filepath)
+                    if status == 'item':
+                        pending[value[0]] = value[1]
+                    else:
+                        finished.add(active.pop(conn))
+            # Whatever is left comes after a gap left by a failed worker
+            for index in sorted(pending):
+                yield index, pending[index]
+        except ExtractionError:
+            failed = True
+            raise
+        finally:
+            stopped = failed or (stop_event is not None and stop_event.is_set())
+            for part, worker in enumerate(workers):
+                healthy = part in finished or (not stopped and self._drain(worker, filepath))
+                self._checkin(worker, healthy)
+            for _ in range(held):
+                slots.release()
+
+    def _drain(self, worker, filepath):
+        """Asks a worker to end its stream early; returns True if it did so within a second."""
+        conn = worker[1]
+        try:
+            conn.send('stop')
+            deadline = time.monotonic() + 1
+            while conn.poll(max(0, deadline - time.monotonic())):
+                status, _ = self._receive(conn, filepath)
+                if status != 'item':
+                    return True
+        except (ExtractionError, OSError):
+            pass
+        return False
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for worker in idle:
+            self._kill(worker)
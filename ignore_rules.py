@@ -0,0 +1,198 @@
+import os
+import re
+
+IGNORE_FILE_NAMES = ('.gitignore', '.ignore')
+
+
+def split_globs(text):
+    """Splits a sidebar field such as '*.py, docs/*.md' into a list of globs."""
+    return [glob for glob in re.split(r'[,;\s]+', text or '') if glob]
+
+
+def _glob_to_regex(glob):
+    """Translates a gitignore-style glob into a regex: '*' and '?' stay within one path segment, '**' spans segments."""
+    out = []
+    i = 0
+    n = len(glob)
+    while i < n:
+        c = glob[i]
+        if c == '*':
+            if glob.startswith('**', i):
+                if glob.startswith('**/', i):
+                    out.append('(?:.*/)?') # Zero or more directories
+                    i += 3
+                else:
+                    out.append('.*')
+                    i += 2
+                continue
+            out.append('[^/]*')
+        elif c == '?':
+            out.append('[^/]')
+        elif c == '[':
+            end = glob.find(']', i + 2)
+            if end < 0:
+                out.append(re.escape(c))
+            else:
+                body = glob[i + 1:end]
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                out.append('[' + body.replace('\\', '\\\\') + ']')
+                i = end
+        elif c == '\\' and i + 1 < n:
+            out.append(re.escape(glob[i + 1]))
+            i += 1
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return ''.join(out)
+
+
+def _compile_rule(line):
+    """Parses one gitignore line into (regex source, negate, dir_only), or None for blanks and comments."""
+    line = line.rstrip('\n').rstrip('\r')
+    if not line.endswith('\\ '):
+        line = line.rstrip(' ')
+    if not line or line.startswith('#'):
+        return None
+    negate = line.startswith('!')
+    if negate:
+        line = line[1:]
+    elif line.startswith('\\'):
+        line = line[1:] # Escaped leading '#' or '!'
+    dir_only = line.endswith('/')
+    line = line.rstrip('/')
+    if not line:
+        return None
+    # A slash anywhere but the end anchors the glob to the ignore file's folder;
+    # otherwise it matches the name at any depth
+    anchored = '/' in line
+    line = line.lstrip('/')
+    source = _glob_to_regex(line)
+    if not anchored:
+        source = '(?:.*/)?' + source
+    return source, negate, dir_only
+
+
+class IgnoreRules:
+    """
+    Compiled rules of one .gitignore-style file (or a list of user globs), matched against
+    paths relative to its folder. Rule sets without negations are merged into one regex per
+    kind of entry, so a check is a single match call.
+    """
+
+    def __init__(self, base, lines):
+        self.base = base
+        self.prefix_len = len(base) if base.endswith(os.sep) else len(base) + 1
+        rules = [rule for rule in map(_compile_rule, lines) if rule]
+        self.empty = not rules
+        self.ordered = None
+        if any(negate for _, negate, _ in rules):
+            # Last matching rule wins, so check them from the bottom up
+            self.ordered = [(re.compile(source + r'\Z'), negate, dir_only) for source, negate, dir_only in reversed(rules)]
+        else:
+            file_sources = [source for source, _, dir_only in rules if not dir_only]
+            all_sources = [source for source, _, _ in rules]
+            self.file_regex = re.compile('|'.join(f'(?:{s})' for s in file_sources) + r'\Z') if file_sources else None
+            self.dir_regex = re.compile('|'.join(f'(?:{s})' for s in all_sources) + r'\Z') if all_sources else None
+
+    @classmethod
+    def from_file(cls, base, path):
+        try:
+            with open(path, encoding='utf-8', errors='ignore') as f:
+                return cls(base, f.readlines())
+        except OSError:
+            return None
+
+    def relative(self, path):
+        rel = path[self.prefix_len:]
+        return rel.replace(os.sep, '/') if os.sep != '/' else rel
+
+    def match(self, path, is_dir):
+        """Returns True if path is ignored, False if a negation re-includes it, or None if no rule applies."""
+        rel = self.relative(path)
+        if self.ordered is None:
+            regex = self.dir_regex if is_dir else self.file_regex
+            return True if regex is not None and regex.match(rel) else None
+        for regex, negate, dir_only in self.ordered:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(rel):
+                return not negate
+        return None
+
+
+class PathFilter:
+    """
+    Decides which folders and files a search visits: user exclude globs, nested .gitignore/.ignore
+    files (deeper files take precedence) and user include globs, which only apply to files.
+    Folders are judged before they are listed, so ignored subtrees are never walked.
+    """
+
+    def __init__(self, root, include_globs=(), exclude_globs=(), use_ignore_files=True):
+        # Paths are compared as the walk produces them, so only trailing separators are dropped
+        self.root = root.rstrip(os.sep) or root
+        self.use_ignore_files = use_ignore_files
+        self.include = IgnoreRules(self.root, include_globs) if include_globs else None
+        self.exclude = IgnoreRules(self.root, exclude_globs) if exclude_globs else None
+        # folder -> tuple of IgnoreRules in effect inside it, deepest first
+        self._chains = {}
+        # folder -> True if the folder and all its parents are visited
+        self._dir_verdicts = {self.root: True}
+
+    def load(self, folder, names=None):
+        """Returns the ignore rules in effect inside folder; names (the folder's listing) avoids extra stats."""
+        chain = self._chains.get(folder)
+        if chain is not None:
+            return chain
+        if folder == self.root or len(folder) <= len(self.root):
+            chain = ()
+        else:
+            chain = self.load(os.path.dirname(folder))
+        if self.use_ignore_files:
+            own = []
+            for name in IGNORE_FILE_NAMES:
+                if names is not None and name not in names:
+                    continue
+                rules = IgnoreRules.from_file(folder, os.path.join(folder, name))
+                if rules is not None and not rules.empty:
+                    own.append(rules)
+            # Rules in .ignore take precedence over .gitignore in the same folder
+            chain = tuple(reversed(own)) + chain
+        self._chains[folder] = chain
+        return chain
+
+    def _ignored(self, path, is_dir):
+        if self.exclude is not None and self.exclude.match(path, is_dir):
+            return True
+        for rules in self.load(os.path.dirname(path)):
+            verdict = rules.match(path, is_dir)
+            if verdict is not None:
+                return verdict
+        return False
+
+    def skip_dir(self, path):
+        """True if the folder at path should not be walked (its parent is assumed visited)."""
+        return self._ignored(path, True)
+
+    def skip_file(self, path):
+        """True if the file at path should not be searched (its folder is assumed visited)."""
+        if self._ignored(path, False):
+            return True
+        return self.include is not None and not self.include.match(path, False)
+
+    def allows(self, path):
+        """Full check of a file path that did not come from a filtered walk, including every parent folder."""
+        folder = os.path.dirname(path)
+        if not self._folder_visited(folder):
+            return False
+        return not self.skip_file(path)
+
+    def _folder_visited(self, folder):
+        verdict = self._dir_verdicts.get(folder)
+        if verdict is None:
+            parent = os.path.dirname(folder)
+            if parent == folder or len(folder) < len(self.root):
+                return False # Outside the root
+            verdict = self._folder_visited(parent) and not self.skip_dir(folder)
+            self._dir_verdicts[folder] = verdict
+        return verdict
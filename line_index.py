@@ -0,0 +1,80 @@
+import os
+import threading
+from array import array
+from itertools import accumulate
+
+
+class LineIndex:
+    """
+    Sparse byte offsets of every `step`-th line of a file, so any window of lines can be
+    read without loading the whole file. The index is extended on demand, or to the end
+    of the file by build() running in a background thread.
+    """
+
+    def __init__(self, path, step=256, chunk_size=1024 * 1024):
+        self.path = path
+        self.step = step
+        self.chunk_size = chunk_size
+        self.size = os.path.getsize(path)
+        # checkpoints[k] is the byte offset where line k * step starts
+        self.checkpoints = array('q', [0])
+        self.newlines_seen = 0
+        self.scan_pos = 0
+        self.complete = False
+        self.cancelled = False
+        self.lock = threading.Lock()
+
+    @property
+    def line_count(self):
+        """Total number of lines once the index is complete, otherwise the number seen so far."""
+        return self.newlines_seen + 1
+
+    def _extend(self, target_line=None):
+        """Scans forward until the checkpoint for target_line is known, or to the end of the file."""
+        while not self.cancelled:
+            # The lock is taken per chunk so readers never wait for a whole background build
+            with self.lock:
+                if self.complete:
+                    return
+                next_line = len(self.checkpoints) * self.step
+                if target_line is not None and next_line > target_line:
+                    return
+
+                with open(self.path, 'rb') as f:
+                    f.seek(self.scan_pos)
+                    chunk = f.read(self.chunk_size)
+                if not chunk:
+                    self.complete = True
+                    return
+
+                newlines = chunk.count(b'\n')
+                if self.newlines_seen + newlines >= next_line:
+                    # Newline i of the chunk sits at lengths[i] + i, and ends line newlines_seen + i
+                    lengths = list(accumulate(map(len, chunk.split(b'\n'))))
+                    first = next_line - self.newlines_seen - 1
+                    for i in range(first, newlines, self.step):
+                        self.checkpoints.append(self.scan_pos + lengths[i] + i + 1)
+                self.newlines_seen += newlines
+                self.scan_pos += len(chunk)
+
+    def build(self):
+        """Indexes the rest of the file; meant to run in a background thread."""
+        self._extend()
+
+    def read_lines(self, start, count):
+        """Returns up to count decoded lines starting at line number start."""
+        self._extend(start)
+        checkpoint = min(start // self.step, len(self.checkpoints) - 1)
+        offset = self.checkpoints[checkpoint]
+        lines = []
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            for _ in range(start - checkpoint * self.step):
+                if not f.readline():
+                    return lines
+            for _ in range(count):
+                line = f.readline()
+                if not line:
+                    break
+                lines.append(line.rstrip(b'\r\n').decode('utf-8', errors='replace'))
+        return lines
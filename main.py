@@ -3,15 +3,17 @@ import os
 import threading
 import subprocess
 import re
+import time
+import multiprocessing
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QHBoxLayout, QPushButton, QLineEdit,
                              QSplitter, QFileDialog, QLabel, QPlainTextEdit,
                              QMessageBox, QProgressBar, QTextEdit, QSpinBox, QCheckBox,
-                             QComboBox, QStyleFactory, QStackedWidget, QTableWidget, 
-                             QTableWidgetItem, QHeaderView, QStyle, QDialog, 
+                             QComboBox, QStyleFactory, QStackedWidget, QTableView,
+                             QAbstractItemView, QHeaderView, QStyle, QDialog,
                              QFormLayout, QTextBrowser)
-from PyQt6.QtGui import QPalette, QColor, QBrush, QFont, QSyntaxHighlighter, QTextCharFormat, QTextCursor, QPainter, QTextFormat, QIcon
-from PyQt6.QtCore import Qt, QThread, pyqtSignal, QObject, QSettings
+from PyQt6.QtGui import QPalette, QColor, QBrush, QFont, QTextCharFormat, QTextCursor, QTextLayout, QPainter, QTextFormat, QIcon
+from PyQt6.QtCore import Qt, QThread, pyqtSignal, QObject, QSettings, QAbstractTableModel, QModelIndex, QFileSystemWatcher, QTimer
 
 def resource_path(relative_path):
     """ Get absolute path to resource, works for dev and for PyInstaller """
@@ -24,19 +26,43 @@ def resource_path(relative_path):
     return os.path.join(base_path, relative_path)
 
 
-from search_engine import SearchEngine
+from search_engine import SearchEngine, match_location
+from line_index import LineIndex
+from result_cache import ResultCache
+from search_stats import format_summary
+from ignore_rules import PathFilter, split_globs
+from scan_scheduler import SCAN_ORDERS
 from pygments import lex
 from pygments.lexers import get_lexer_for_filename, TextLexer
 from pygments.styles import get_style_by_name, get_all_styles
 from pygments.token import Token
 from PyQt6.QtGui import QPalette, QColor, QBrush
 
-class PygmentsHighlighter(QSyntaxHighlighter):
-    def __init__(self, document, style_name='default'):
-        super().__init__(document)
+class PygmentsHighlighter(QObject):
+    """
+    Highlights a QPlainTextEdit with Pygments. The whole document is lexed once in a
+    background thread, so lexer state carries across lines, and the token runs are cached
+    per block. Formats are only applied to blocks as they scroll into view.
+    """
+    lexed = pyqtSignal(int, object)
+
+    # Blocks past the bottom of the viewport that are formatted ahead of scrolling
+    lookahead_blocks = 20
+
+    def __init__(self, editor, style_name='default'):
+        super().__init__(editor)
+        self.editor = editor
         self.lexer = TextLexer()
         self.style = get_style_by_name(style_name)
+        # Bumped for every new text so stale background results are dropped
+        self.lex_generation = 0
+        # Bumped whenever formats must be reapplied; stored in each formatted block's userState
+        self.format_generation = 0
+        self.runs = []
         self._cache_formats()
+        self.lexed.connect(self.on_lexed)
+        self.editor.updateRequest.connect(self.apply_visible)
+        self.editor.verticalScrollBar().valueChanged.connect(self.apply_visible)
 
     def _cache_formats(self):
         self.formats = {}
@@ -53,30 +79,100 @@ class PygmentsHighlighter(QSyntaxHighlighter):
             if style['underline']:
                 fmt.setFontUnderline(True)
             self.formats[token] = fmt
+        self.token_formats = {}
+
+    def _format_for(self, token):
+        """Finds the best matching format for a token, walking up to its parents."""
+        fmt = self.token_formats.get(token)
+        if fmt is None:
+            match = token
+            while match is not None and match not in self.formats:
+                match = match.parent
+            fmt = self.formats.get(match, False) if match is not None else False
+            self.token_formats[token] = fmt
+        return fmt
 
     def set_file(self, filepath):
         try:
             self.lexer = get_lexer_for_filename(filepath)
         except:
             self.lexer = TextLexer()
-        self.rehighlight()
+        self.relex()
 
     def set_style(self, style_name):
         self.style = get_style_by_name(style_name)
         self._cache_formats()
-        self.rehighlight()
-
-    def highlightBlock(self, text):
-        for index, token, value in self.lexer.get_tokens_unprocessed(text):
-            length = len(value)
-            # Find the best matching format for the token
-            while token not in self.formats:
-                token = token.parent
-                if token is None:
-                    break
-            
-            if token in self.formats:
-                self.setFormat(index, length, self.formats[token])
+        # Token runs stay valid; only the visible blocks need new formats
+        self.format_generation += 1
+        self.apply_visible()
+
+    def relex(self):
+        """Lexes the editor's current text in the background; call after replacing the text."""
+        self.lex_generation += 1
+        self.runs = []
+        text = self.editor.toPlainText()
+        threading.Thread(target=self._lex, args=(self.lex_generation, self.lexer, text), daemon=True).start()
+
+    def _lex(self, generation, lexer, text):
+        # runs[n] holds (start, length, token) for block n, relative to the start of the line
+        runs = [[]]
+        line_start = 0
+        try:
+            for count, (index, token, value) in enumerate(lexer.get_tokens_unprocessed(text)):
+                if count % 1000 == 0 and generation != self.lex_generation:
+                    return # A newer text replaced this one
+                start = index
+                for i, part in enumerate(value.split('\n')):
+                    if i > 0:
+                        runs.append([])
+                        line_start = start
+                    if part:
+                        runs[-1].append((start - line_start, len(part), token))
+                    start += len(part) + 1
+        except Exception as e:
+            print(f"Error highlighting: {e}")
+            return
+        self.lexed.emit(generation, runs)
+
+    def on_lexed(self, generation, runs):
+        if generation != self.lex_generation:
+            return
+        self.runs = runs
+        self.format_generation += 1
+        self.apply_visible()
+
+    def apply_visible(self, *args):
+        """Applies cached token formats to the visible blocks that do not have them yet."""
+        if not self.runs:
+            return
+        block = self.editor.firstVisibleBlock()
+        offset = self.editor.contentOffset()
+        bottom = self.editor.viewport().rect().bottom()
+        top = self.editor.blockBoundingGeometry(block).translated(offset).top()
+        extra = self.lookahead_blocks
+        while block.isValid() and extra > 0:
+            if top > bottom:
+                extra -= 1
+            if block.userState() != self.format_generation:
+                self._format_block(block)
+            top += self.editor.blockBoundingRect(block).height()
+            block = block.next()
+
+    def _format_block(self, block):
+        number = block.blockNumber()
+        ranges = []
+        if number < len(self.runs):
+            for start, length, token in self.runs[number]:
+                fmt = self._format_for(token)
+                if fmt:
+                    fmt_range = QTextLayout.FormatRange()
+                    fmt_range.start = start
+                    fmt_range.length = length
+                    fmt_range.format = fmt
+                    ranges.append(fmt_range)
+        block.setUserState(self.format_generation)
+        block.layout().setFormats(ranges)
+        self.editor.document().markContentsDirty(block.position(), block.length())
 
 
 class LineNumberArea(QWidget):
@@ -95,6 +191,8 @@ class CodeEditor(QPlainTextEdit):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.lineNumberArea = LineNumberArea(self)
+        # Number of the first loaded line when only a window of a large file is shown
+        self.line_offset = 0
 
         self.blockCountChanged.connect(self.updateLineNumberAreaWidth)
         self.updateRequest.connect(self.updateLineNumberArea)
@@ -104,7 +202,7 @@ class CodeEditor(QPlainTextEdit):
 
     def lineNumberAreaWidth(self):
         digits = 1
-        max_value = max(1, self.blockCount())
+        max_value = max(1, self.blockCount() + self.line_offset)
         while max_value >= 10:
             max_value //= 10
             digits += 1
@@ -113,6 +211,11 @@ class CodeEditor(QPlainTextEdit):
         space = 10 + self.fontMetrics().horizontalAdvance('9') * digits
         return space
 
+    def set_line_offset(self, offset):
+        self.line_offset = offset
+        self.updateLineNumberAreaWidth(0)
+        self.lineNumberArea.update()
+
     def lineNumberAreaSizeHint(self):
         return self.lineNumberAreaWidth(), 0
 
@@ -152,7 +255,7 @@ class CodeEditor(QPlainTextEdit):
 
         while block.isValid() and top <= event.rect().bottom():
             if block.isVisible() and bottom >= event.rect().top():
-                number = str(blockNumber + 1)
+                number = str(blockNumber + 1 + self.line_offset)
                 # Subtract 5px padding from the right to ensure a gap from the border
                 painter.drawText(0, top, self.lineNumberArea.width() - 5, self.fontMetrics().height(),
                                  Qt.AlignmentFlag.AlignRight, number)
@@ -179,13 +282,107 @@ class CodeEditor(QPlainTextEdit):
         self.setExtraSelections(extraSelections)
 
 
+class ResultsTableModel(QAbstractTableModel):
+    """Table model over a flat list of (name, score, folder, result) rows, so the view only renders what is visible."""
+    headers = ["Name", "Match %", "Path"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        name, score, folder, result = self.rows[index.row()]
+        column = index.column()
+        if role == Qt.ItemDataRole.DisplayRole:
+            if column == 0:
+                return name
+            if column == 1:
+                return "Failed" if 'error' in result else f"{score:.1f}%"
+            return folder
+        if role == Qt.ItemDataRole.ToolTipRole and 'error' in result:
+            return result['error']
+        if role == Qt.ItemDataRole.UserRole:
+            return result
+        return None
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.headers[section]
+        return None
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        self.layoutAboutToBeChanged.emit()
+        # Column 1 sorts on the numeric score rather than the formatted text
+        self.rows.sort(key=lambda row: row[column], reverse=order == Qt.SortOrder.DescendingOrder)
+        self.layoutChanged.emit()
+
+    def add_results(self, results):
+        if not results:
+            return
+        first = len(self.rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(results) - 1)
+        self.rows.extend((r['filename'], r['score'], os.path.dirname(r['path']), r) for r in results)
+        self.endInsertRows()
+
+    def update_results(self, changes):
+        """Applies {path: result or None} in place: rows are replaced, removed when None, or added."""
+        changes = dict(changes)
+        for row in range(len(self.rows) - 1, -1, -1):
+            path = self.rows[row][3]['path']
+            if path not in changes:
+                continue
+            r = changes.pop(path)
+            if r is None:
+                self.beginRemoveRows(QModelIndex(), row, row)
+                del self.rows[row]
+                self.endRemoveRows()
+            else:
+                self.rows[row] = (r['filename'], r['score'], os.path.dirname(r['path']), r)
+                self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.headers) - 1))
+        self.add_results([r for r in changes.values() if r])
+
+    def limit_results(self, top_k=0, max_results=0):
+        """
+        Drops matched rows beyond a search's top_k best scores or its max_results, so rows added by
+        update_results obey the same limits; on ties the earlier row is kept. Failed rows always stay.
+        """
+        matched = [row for row, r in enumerate(self.rows) if 'error' not in r[3]]
+        keep = matched
+        if top_k:
+            keep = sorted(keep, key=lambda row: -self.rows[row][1])[:top_k]
+        if max_results:
+            keep = sorted(keep)[:max_results]
+        drop = set(matched) - set(keep)
+        for row in sorted(drop, reverse=True):
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self.rows[row]
+            self.endRemoveRows()
+
+    def clear(self):
+        self.beginResetModel()
+        self.rows = []
+        self.endResetModel()
+
+    def result(self, row):
+        return self.rows[row][3]
+
+
 class SearchWorker(QThread):
-    result_found = pyqtSignal(dict)
+    # Results are delivered in batches at most every batch_interval seconds
+    results_found = pyqtSignal(list)
     finished_search = pyqtSignal()
     progress_update = pyqtSignal(object)
     error_occurred = pyqtSignal(str)
 
-    def __init__(self, search_engine, directory, query, stop_event, threshold=60, use_regex=False, search_office=False, case_sensitive=False, limit_per_file=0):
+    def __init__(self, search_engine, directory, query, stop_event, threshold=60, use_regex=False, search_office=False, case_sensitive=False, limit_per_file=0, use_index=False, workers=1, expected_total=0, multiline=False, large_files=False, large_file_threshold=1024 * 1024, use_cache=False, collect_stats=False, top_k=0, max_results=0, include_globs=None, exclude_globs=None, use_ignore_files=False, scan_order='walk', pinned_folder=None, io_threads=0):
         super().__init__()
         self.search_engine = search_engine
         self.directory = directory
@@ -196,6 +393,36 @@ class SearchWorker(QThread):
         self.search_office = search_office
         self.case_sensitive = case_sensitive
         self.limit_per_file = limit_per_file
+        self.use_index = use_index
+        self.workers = workers
+        self.expected_total = expected_total
+        self.multiline = multiline
+        self.large_files = large_files
+        self.large_file_threshold = large_file_threshold
+        self.use_cache = use_cache
+        self.collect_stats = collect_stats
+        self.top_k = top_k
+        self.max_results = max_results
+        self.include_globs = include_globs or []
+        self.exclude_globs = exclude_globs or []
+        self.use_ignore_files = use_ignore_files
+        self.scan_order = scan_order
+        self.pinned_folder = pinned_folder
+        self.io_threads = io_threads
+        self.batch_interval = 0.05
+        self.pending = []
+        self.last_flush = 0.0
+
+    def flush_results(self, force=False):
+        if self.pending and (force or time.monotonic() - self.last_flush >= self.batch_interval):
+            self.results_found.emit(self.pending)
+            self.pending = []
+            self.last_flush = time.monotonic()
+
+    def on_progress(self, msg_data):
+        self.progress_update.emit(msg_data)
+        # Progress updates double as a heartbeat so a lone result is not held back
+        self.flush_results()
 
     def run(self):
         try:
@@ -207,24 +434,274 @@ class SearchWorker(QThread):
                 self.query,
                 stop_event=self.stop_event,
                 threshold=self.threshold,
-                update_callback=self.progress_update.emit,
+                update_callback=self.on_progress,
                 use_regex=self.use_regex,
                 search_office=self.search_office,
                 case_sensitive=self.case_sensitive,
-                limit_per_file=self.limit_per_file
+                limit_per_file=self.limit_per_file,
+                use_index=self.use_index,
+                workers=self.workers,
+                expected_total=self.expected_total,
+                multiline=self.multiline,
+                large_files=self.large_files,
+                large_file_threshold=self.large_file_threshold,
+                use_cache=self.use_cache,
+                collect_stats=self.collect_stats,
+                top_k=self.top_k,
+                max_results=self.max_results,
+                include_globs=self.include_globs,
+                exclude_globs=self.exclude_globs,
+                use_ignore_files=self.use_ignore_files,
+                scan_order=self.scan_order,
+                pinned_folder=self.pinned_folder,
+                io_threads=self.io_threads
             )
 
+            self.last_flush = time.monotonic()
             for res in results:
                 if self.stop_event.is_set():
                     break
-                self.result_found.emit(res)
-                
+                self.pending.append(res)
+                self.flush_results()
+
         except Exception as e:
             self.error_occurred.emit(str(e))
         finally:
+            self.flush_results(force=True)
             self.finished_search.emit()
 
 
+class DirectoryWatcher(QObject):
+    """
+    Keeps a (size, mtime) snapshot of every folder in a searched tree and reports the files
+    that were created, modified or deleted. Folders are watched with QFileSystemWatcher for
+    created/deleted entries; files are watched individually up to max_watched_files, since
+    inotify does not report in-place writes on a folder watch. Files past that cap, or in
+    folders the OS refused to watch, are covered by a slow polling sweep instead. With a
+    path_filter (the search's ignore_rules.PathFilter), filtered-out folders and files are
+    neither snapshotted nor watched. snapshots, from snapshot_tree, lets the initial listing of
+    a large tree run off the GUI thread (see SnapshotWorker); by default it is built here.
+    """
+    files_changed = pyqtSignal(list)
+
+    debounce_ms = 300
+    max_watched_files = 8192
+    poll_interval_ms = 2000
+    poll_folders = 50
+
+    def __init__(self, directory, excludes, path_filter=None, snapshots=None, parent=None):
+        super().__init__(parent)
+        self.directory = directory
+        self.excludes = excludes
+        self.path_filter = path_filter
+        # folder -> {path: (size, mtime_ns)}
+        self.snapshots = {}
+        self.dirty = set()
+        self.watched_files = set()
+        self.needs_polling = False
+        self.poll_queue = []
+
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self.on_path_changed)
+        self.watcher.fileChanged.connect(lambda path: self.on_path_changed(os.path.dirname(path)))
+        self.debounce = QTimer(self)
+        self.debounce.setSingleShot(True)
+        self.debounce.setInterval(self.debounce_ms)
+        self.debounce.timeout.connect(self.process_changes)
+        self.poll_timer = QTimer(self)
+        self.poll_timer.setInterval(self.poll_interval_ms)
+        self.poll_timer.timeout.connect(self.poll)
+
+        if snapshots is None:
+            snapshots = self.snapshot_tree(directory, excludes, path_filter)
+        self._watch_tree(snapshots)
+        if self.needs_polling:
+            self.poll_timer.start()
+
+    @staticmethod
+    def _list_folder(folder, excludes, path_filter):
+        """Returns ({path: (size, mtime_ns)}, subfolders) of one folder, or (None, []) if it is gone."""
+        files = {}
+        subdirs = []
+        try:
+            with os.scandir(folder) as it:
+                entries = list(it)
+        except OSError:
+            return None, []
+        if path_filter is not None:
+            # Reads this folder's .gitignore/.ignore, as the search's walk did
+            path_filter.load(folder.rstrip(os.sep) or folder, {entry.name for entry in entries})
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in excludes and not (path_filter is not None and path_filter.skip_dir(entry.path)):
+                        subdirs.append(entry.path)
+                elif entry.is_file():
+                    if path_filter is not None and path_filter.skip_file(entry.path):
+                        continue
+                    st = entry.stat()
+                    files[entry.path] = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                continue
+        return files, subdirs
+
+    @staticmethod
+    def snapshot_tree(folder, excludes, path_filter=None, stop_event=None):
+        """
+        Lists folder and everything below it without touching Qt, so it can run in a worker thread.
+        Returns {folder: {path: (size, mtime_ns)}}, or None if stop_event was set.
+        """
+        snapshots = {}
+        stack = [folder]
+        while stack:
+            if stop_event is not None and stop_event.is_set():
+                return None
+            current = stack.pop()
+            files, subdirs = DirectoryWatcher._list_folder(current, excludes, path_filter)
+            if files is None:
+                continue
+            snapshots[current] = files
+            stack.extend(subdirs)
+        return snapshots
+
+    def _list(self, folder):
+        return self._list_folder(folder, self.excludes, self.path_filter)
+
+    def _watch_files(self, paths):
+        room = self.max_watched_files - len(self.watched_files)
+        if len(paths) > room:
+            self.needs_polling = True
+            paths = paths[:max(room, 0)]
+        if paths:
+            failed = self.watcher.addPaths(paths)
+            self.watched_files.update(set(paths) - set(failed))
+            if failed:
+                self.needs_polling = True
+
+    def _watch_tree(self, snapshots):
+        """Takes over snapshots from snapshot_tree and watches their folders and files. Returns the files."""
+        self.snapshots.update(snapshots)
+        found = [path for files in snapshots.values() for path in files]
+        if snapshots and self.watcher.addPaths(list(snapshots)):
+            self.needs_polling = True
+        self._watch_files(found)
+        return found
+
+    def _add_tree(self, folder):
+        """Snapshots and watches folder and everything below it. Returns the files found."""
+        return self._watch_tree(self.snapshot_tree(folder, self.excludes, self.path_filter))
+
+    def _remove_tree(self, folder):
+        """Forgets folder and everything below it. Returns the files it held."""
+        prefix = folder + os.sep
+        gone = [f for f in self.snapshots if f == folder or f.startswith(prefix)]
+        deleted = []
+        for f in gone:
+            deleted.extend(self.snapshots.pop(f))
+        self.watched_files.difference_update(deleted)
+        return deleted
+
+    def on_path_changed(self, folder):
+        self.dirty.add(folder)
+        self.debounce.start()
+
+    def process_changes(self):
+        dirty, self.dirty = self.dirty, set()
+        changed = []
+        for folder in dirty:
+            changed.extend(self._rescan_folder(folder))
+        if changed:
+            self.files_changed.emit(changed)
+
+    def _rescan_folder(self, folder):
+        if folder not in self.snapshots:
+            return [] # Already dropped with a removed parent
+        files, subdirs = self._list(folder)
+        if files is None:
+            return self._remove_tree(folder)
+
+        old = self.snapshots[folder]
+        self.snapshots[folder] = files
+        changed = [path for path, signature in files.items() if old.get(path) != signature]
+        deleted = [path for path in old if path not in files]
+        self.watched_files.difference_update(deleted)
+        # Editors that save by replacing the file drop the old watch, so watch the new one
+        self._watch_files([path for path in changed if path not in self.watched_files])
+
+        current = set(subdirs)
+        for sub in subdirs:
+            if sub not in self.snapshots:
+                changed.extend(self._add_tree(sub))
+        for known in [f for f in self.snapshots if os.path.dirname(f) == folder and f != folder]:
+            if known not in current:
+                deleted.extend(self._remove_tree(known))
+        return changed + deleted
+
+    def poll(self):
+        """Re-lists a few folders per tick, so unwatched files are still noticed at low cost."""
+        if not self.poll_queue:
+            self.poll_queue = list(self.snapshots)
+        batch = self.poll_queue[-self.poll_folders:]
+        del self.poll_queue[-self.poll_folders:]
+        for folder in batch:
+            self.dirty.add(folder)
+        self.process_changes()
+
+    def stop(self):
+        self.debounce.stop()
+        self.poll_timer.stop()
+        paths = self.watcher.directories() + self.watcher.files()
+        if paths:
+            self.watcher.removePaths(paths)
+
+
+class SnapshotWorker(QThread):
+    """Builds the DirectoryWatcher snapshot of a finished search's tree off the GUI thread."""
+    snapshotted = pyqtSignal(object, object, object)
+
+    def __init__(self, search_worker, excludes, path_filter=None):
+        super().__init__()
+        self.search_worker = search_worker
+        self.excludes = excludes
+        self.path_filter = path_filter
+        self.stop_event = threading.Event()
+
+    def run(self):
+        snapshots = None
+        try:
+            snapshots = DirectoryWatcher.snapshot_tree(self.search_worker.directory, self.excludes,
+                                                       self.path_filter, self.stop_event)
+        except Exception as e:
+            print(f"Error listing {self.search_worker.directory}: {e}")
+        if snapshots is not None:
+            self.snapshotted.emit(self.search_worker, self.path_filter, snapshots)
+
+
+class RescanWorker(QThread):
+    """Re-runs a finished search's matching on just the files a DirectoryWatcher reported."""
+    rescanned = pyqtSignal(object, dict)
+
+    def __init__(self, search_worker, paths):
+        super().__init__()
+        self.search_worker = search_worker
+        self.paths = paths
+        self.stop_event = threading.Event()
+
+    def run(self):
+        w = self.search_worker
+        changes = {}
+        try:
+            for path, result in w.search_engine.search_paths(
+                    self.paths, w.query, stop_event=self.stop_event, threshold=w.threshold,
+                    use_regex=w.use_regex, search_office=w.search_office, case_sensitive=w.case_sensitive,
+                    limit_per_file=w.limit_per_file, multiline=w.multiline, large_files=w.large_files,
+                    large_file_threshold=w.large_file_threshold):
+                changes[path] = result
+        except Exception as e:
+            print(f"Error rescanning changed files: {e}")
+        self.rescanned.emit(w, changes)
+
+
 class RegexDesignerDialog(QDialog):
     def __init__(self, parent=None, initial_pattern=""):
         super().__init__(parent)
@@ -341,11 +818,28 @@ class MainWindow(QMainWindow):
         self.setGeometry(100, 100, 1000, 700)
 
         self.search_engine = SearchEngine()
+        # Results of repeated searches are kept on disk so they survive restarts
+        self.search_engine.result_cache = ResultCache(os.path.join(self.search_engine.cache_dir, 'results.pickle'))
         self.stop_event = threading.Event()
         self.worker = None
+        self.watcher = None
+        self.search_stats = None
+        self.rescan_worker = None
+        self.snapshot_worker = None
+        self.pending_rescan = []
 
         self.current_matches = []
         self.current_match_index = -1
+        # Result shown in the preview; document results carry the page or cell of their lines
+        self.current_result = {}
+
+        # Files above preview_window_threshold are previewed a window of lines at a time
+        self.preview_window_threshold = 4 * 1024 * 1024
+        self.preview_window_lines = 2000
+        self.preview_index = None
+        self.preview_start = 0
+        self.preview_count = 0
+        self.preview_loading = False
 
         self.settings = QSettings("Grapper", "GrapperApp")
         # Initialize variables before UI
@@ -427,9 +921,15 @@ class MainWindow(QMainWindow):
         self.chk_office = QCheckBox("Office")
         self.chk_regex = QCheckBox("Regex")
         self.chk_case = QCheckBox("Case")
+        self.chk_index = QCheckBox("Index")
+        self.chk_index.setToolTip("Keep a trigram index of the directory to speed up repeat regex searches (fuzzy searches always scan)")
         match_params_layout.addWidget(self.chk_office)
         match_params_layout.addWidget(self.chk_regex)
         match_params_layout.addWidget(self.chk_case)
+        self.chk_cache = QCheckBox("Cache")
+        self.chk_cache.setToolTip("Reuse the results of an identical earlier search and rescan only changed files")
+        match_params_layout.addWidget(self.chk_index)
+        match_params_layout.addWidget(self.chk_cache)
         
         btn_regex_help = QPushButton()
         btn_regex_help.setIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_MessageBoxInformation))
@@ -440,6 +940,93 @@ class MainWindow(QMainWindow):
         match_params_layout.addWidget(btn_regex_help)
         match_section.addLayout(match_params_layout)
 
+        workers_layout = QHBoxLayout()
+        lbl_workers = QLabel("Workers:")
+        lbl_workers.setToolTip("Number of processes used to search files (1 = no parallelism)")
+        self.spin_workers = QSpinBox()
+        self.spin_workers.setRange(1, max(1, os.cpu_count() or 1) * 2)
+        self.spin_workers.setValue(1)
+        workers_layout.addWidget(lbl_workers)
+        workers_layout.addWidget(self.spin_workers)
+        lbl_io_threads = QLabel("Readers:")
+        lbl_io_threads.setToolTip("Threads that read files ahead of the matcher (0 = read inline); helps on slow or network drives")
+        self.spin_io_threads = QSpinBox()
+        self.spin_io_threads.setRange(0, 64)
+        self.spin_io_threads.setValue(0)
+        workers_layout.addWidget(lbl_io_threads)
+        workers_layout.addWidget(self.spin_io_threads)
+        self.chk_multiline = QCheckBox("Multiline")
+        self.chk_multiline.setToolTip("Let regex matches span several lines")
+        workers_layout.addWidget(self.chk_multiline)
+        self.chk_stats = QCheckBox("Stats")
+        self.chk_stats.setToolTip("Time each search phase and show where the time went in the status bar")
+        workers_layout.addWidget(self.chk_stats)
+        workers_layout.addStretch()
+        match_section.addLayout(workers_layout)
+
+        limits_layout = QHBoxLayout()
+        lbl_top_k = QLabel("Best:")
+        lbl_top_k.setToolTip("Only show the best N files across the tree (0 = all)")
+        self.spin_top_k = QSpinBox()
+        self.spin_top_k.setRange(0, 100000)
+        self.spin_top_k.setValue(0)
+        lbl_max_results = QLabel("Stop after:")
+        lbl_max_results.setToolTip("End the search once N files have matched (0 = never)")
+        self.spin_max_results = QSpinBox()
+        self.spin_max_results.setRange(0, 1000000)
+        self.spin_max_results.setValue(0)
+        limits_layout.addWidget(lbl_top_k)
+        limits_layout.addWidget(self.spin_top_k)
+        limits_layout.addWidget(lbl_max_results)
+        limits_layout.addWidget(self.spin_max_results)
+        limits_layout.addStretch()
+        match_section.addLayout(limits_layout)
+
+        filters_layout = QFormLayout()
+        self.entry_include = QLineEdit()
+        self.entry_include.setPlaceholderText("e.g. *.py, docs/**/*.md")
+        self.entry_include.setToolTip("Only search files matching these globs (comma separated; empty = all files)")
+        self.entry_exclude = QLineEdit()
+        self.entry_exclude.setPlaceholderText("e.g. build/, *.min.js")
+        self.entry_exclude.setToolTip("Skip files and folders matching these gitignore-style globs (comma separated)")
+        self.chk_ignore_files = QCheckBox("Use .gitignore")
+        self.chk_ignore_files.setToolTip("Skip paths ignored by .gitignore and .ignore files anywhere in the tree")
+        filters_layout.addRow("Include:", self.entry_include)
+        filters_layout.addRow("Exclude:", self.entry_exclude)
+        filters_layout.addRow("", self.chk_ignore_files)
+        self.combo_scan_order = QComboBox()
+        # Display names in SCAN_ORDERS order
+        self.combo_scan_order.addItems(["Folder order", "Recently modified first", "Smallest first"])
+        self.combo_scan_order.setToolTip("Which files are searched first; results appear sooner for the files you likely want")
+        self.entry_pinned = QLineEdit()
+        self.entry_pinned.setPlaceholderText("e.g. src/app")
+        self.entry_pinned.setToolTip("Subfolder searched before the rest of the tree (relative or absolute)")
+        filters_layout.addRow("Order:", self.combo_scan_order)
+        filters_layout.addRow("Pin folder:", self.entry_pinned)
+        self.spin_extract_timeout = QSpinBox()
+        self.spin_extract_timeout.setRange(1, 3600)
+        self.spin_extract_timeout.setValue(30)
+        self.spin_extract_timeout.setSuffix(" s")
+        self.spin_extract_timeout.setToolTip("Give up on an Office or PDF document after this long; it is listed as failed")
+        filters_layout.addRow("Doc timeout:", self.spin_extract_timeout)
+        match_section.addLayout(filters_layout)
+
+        large_files_layout = QHBoxLayout()
+        self.chk_large_files = QCheckBox("Large files over")
+        self.chk_large_files.setToolTip("Scan files above the size limit through a memory map instead of skipping them")
+        self.spin_large_file_mb = QSpinBox()
+        self.spin_large_file_mb.setRange(1, 1024)
+        self.spin_large_file_mb.setValue(1)
+        self.spin_large_file_mb.setSuffix(" MB")
+        large_files_layout.addWidget(self.chk_large_files)
+        large_files_layout.addWidget(self.spin_large_file_mb)
+        self.chk_watch = QCheckBox("Watch")
+        self.chk_watch.setToolTip("Keep the results up to date as files in the directory change")
+        self.chk_watch.toggled.connect(self.update_watching)
+        large_files_layout.addWidget(self.chk_watch)
+        large_files_layout.addStretch()
+        match_section.addLayout(large_files_layout)
+
         sidebar_layout.addLayout(match_section)
 
         # 4. Appearance Section
@@ -532,18 +1119,21 @@ class MainWindow(QMainWindow):
         sidebar_layout.addWidget(self.lbl_status)
 
         # Results Table
-        self.table_results = QTableWidget()
-        self.table_results.setColumnCount(3)
-        self.table_results.setHorizontalHeaderLabels(["Name", "Match %", "Path"])
+        self.results_model = ResultsTableModel(self)
+        self.table_results = QTableView()
+        self.table_results.setModel(self.results_model)
         self.table_results.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Interactive)
         self.table_results.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Interactive)
         self.table_results.horizontalHeader().setSectionResizeMode(2, QHeaderView.ResizeMode.Interactive)
         self.table_results.horizontalHeader().setStretchLastSection(True)
         self.table_results.setSortingEnabled(True)
         self.table_results.verticalHeader().setVisible(False)
-        self.table_results.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
-        self.table_results.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
-        self.table_results.itemSelectionChanged.connect(self.load_file_from_selected_row)
+        # Fixed row heights keep scrolling cheap with very large result sets
+        self.table_results.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.table_results.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table_results.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.table_results.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table_results.selectionModel().selectionChanged.connect(self.load_file_from_selected_row)
         sidebar_layout.addWidget(self.table_results)
 
         sidebar_widget.setLayout(sidebar_layout)
@@ -627,10 +1217,11 @@ class MainWindow(QMainWindow):
         self.text_editor.setReadOnly(True)
         font = QFont("Consolas", 10)
         self.text_editor.setFont(font)
+        self.text_editor.verticalScrollBar().valueChanged.connect(self.on_preview_scrolled)
         file_viewer_layout.addWidget(self.text_editor)
 
         # Syntax Highlighter
-        self.highlighter = PygmentsHighlighter(self.text_editor.document())
+        self.highlighter = PygmentsHighlighter(self.text_editor)
         
         self.stack.addWidget(self.file_viewer_widget)
         
@@ -671,8 +1262,9 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Warning", "Please enter a search query.")
             return
 
+        self.stop_watching()
         self.table_results.setSortingEnabled(False)
-        self.table_results.setRowCount(0)
+        self.results_model.clear()
         self.text_editor.clear()
         self.lbl_filepath.setText("")
         self.stack.setCurrentWidget(self.placeholder_widget)
@@ -687,11 +1279,33 @@ class MainWindow(QMainWindow):
         search_office = self.chk_office.isChecked()
         case_sensitive = self.chk_case.isChecked()
         limit_per_file = self.spin_limit_per_file.value()
-        self.worker = SearchWorker(self.search_engine, directory, query, self.stop_event, threshold, use_regex, search_office, case_sensitive, limit_per_file)
-        self.worker.result_found.connect(self.add_result)
+        use_index = self.chk_index.isChecked()
+        workers = self.spin_workers.value()
+        self.search_engine.extraction_timeout = self.spin_extract_timeout.value()
+        io_threads = self.spin_io_threads.value()
+        # Seed the progress bar with the file count of the last search in this directory
+        expected_total = int(self.file_counts().get(directory, 0))
+        multiline = self.chk_multiline.isChecked()
+        large_files = self.chk_large_files.isChecked()
+        large_file_threshold = self.spin_large_file_mb.value() * 1024 * 1024
+        use_cache = self.chk_cache.isChecked()
+        collect_stats = self.chk_stats.isChecked()
+        top_k = self.spin_top_k.value()
+        max_results = self.spin_max_results.value()
+        include_globs = split_globs(self.entry_include.text())
+        exclude_globs = split_globs(self.entry_exclude.text())
+        use_ignore_files = self.chk_ignore_files.isChecked()
+        scan_order = SCAN_ORDERS[self.combo_scan_order.currentIndex()]
+        pinned_folder = self.entry_pinned.text().strip() or None
+        self.search_stats = None
+        self.lbl_status.setToolTip("")
+        self.worker = SearchWorker(self.search_engine, directory, query, self.stop_event, threshold, use_regex, search_office, case_sensitive, limit_per_file, use_index, workers, expected_total, multiline, large_files, large_file_threshold, use_cache, collect_stats, top_k, max_results, include_globs, exclude_globs, use_ignore_files, scan_order, pinned_folder, io_threads)
+        self.worker.results_found.connect(self.add_results)
         self.worker.progress_update.connect(self.update_status)
         self.worker.error_occurred.connect(self.show_error)
         self.worker.finished_search.connect(self.search_finished)
+        # Once run() has returned, so isRunning() no longer holds watching back
+        self.worker.finished.connect(self.update_watching)
         
         self.worker.start()
 
@@ -700,59 +1314,128 @@ class MainWindow(QMainWindow):
             self.stop_event.set()
             self.lbl_status.setText("Stopping...")
 
+    def file_counts(self):
+        return self.settings.value("file_counts", {}) or {}
+
     def update_status(self, msg_data):
         if isinstance(msg_data, tuple):
             tag, current, total = msg_data
-            if tag == "Scanned":
-                self.lbl_status.setText("Counting files...")
+            if tag == "Indexing":
+                self.lbl_status.setText("Updating index...")
                 self.progress_bar.setMaximum(0) # Busy indicator
             elif tag == "Total":
+                # A zero total (no estimate yet) shows the busy indicator
                 self.progress_bar.setMaximum(total)
-                self.lbl_status.setText(f"Found {total} files. Starting search...")
+                self.lbl_status.setText("Searching...")
             elif tag == "Progress":
+                # The total is a running estimate while the walk is still going
+                self.progress_bar.setMaximum(max(total, current))
                 self.progress_bar.setValue(current)
-                self.lbl_status.setText(f"Scanning {current} of {total}...")
+                self.lbl_status.setText(f"Scanning {current} of ~{total}...")
+            elif tag == "Queues":
+                # total carries the queue depths of the read pipeline
+                self.lbl_status.setText(f"Scanning {current}... (queued: {total['paths']} paths, {total['loaded']} loaded files)")
+            elif tag == "Stats":
+                # total carries the summary dict; shown once the search finishes
+                self.search_stats = total
+            elif tag == "Finished":
+                if self.worker:
+                    counts = self.file_counts()
+                    counts[self.worker.directory] = total
+                    self.settings.setValue("file_counts", counts)
         else:
             self.lbl_status.setText(str(msg_data))
 
-    def add_result(self, result):
-        row = self.table_results.rowCount()
-        self.table_results.insertRow(row)
-        
-        name_item = QTableWidgetItem(result['filename'])
-        
-        # Use a custom QTableWidgetItem for numeric sorting on Match %
-        score_item = QTableWidgetItem()
-        score_item.setData(Qt.ItemDataRole.DisplayRole, f"{result['score']:.1f}%")
-        score_item.setData(Qt.ItemDataRole.EditRole, result['score']) # This helps with sorting
-        
-        path_item = QTableWidgetItem(os.path.dirname(result['path']))
-        
-        # Store the result object for selection handling
-        name_item.setData(Qt.ItemDataRole.UserRole, result)
-        
-        self.table_results.setItem(row, 0, name_item)
-        self.table_results.setItem(row, 1, score_item)
-        self.table_results.setItem(row, 2, path_item)
+    def add_results(self, results):
+        self.results_model.add_results(results)
 
     def search_finished(self):
         self.btn_search.setEnabled(True)
         self.btn_stop.setEnabled(False)
         self.table_results.setSortingEnabled(True)
-        self.lbl_status.setText(f"Done. Found {self.table_results.rowCount()} results.")
+        self.lbl_status.setText(f"Done. Found {self.results_model.rowCount()} results.")
+        if self.search_stats:
+            self.lbl_status.setText(f"{self.lbl_status.text()} | {format_summary(self.search_stats)}")
+            slowest = "\n".join(f"{seconds:.3f}s  {path}" for path, seconds in self.search_stats['slowest'])
+            self.lbl_status.setToolTip(f"Slowest files:\n{slowest}" if slowest else "")
         self.progress_bar.setVisible(False)
 
+    def update_watching(self):
+        """Starts or stops watching the directory of the last completed search."""
+        searching = self.worker is not None and self.worker.isRunning()
+        if not self.chk_watch.isChecked() or self.worker is None or searching or self.stop_event.is_set():
+            self.stop_watching()
+            return
+        if self.watcher is None and self.snapshot_worker is None:
+            w = self.worker
+            # Paths the search filtered out are neither watched nor rescanned
+            path_filter = None
+            if w.include_globs or w.exclude_globs or w.use_ignore_files:
+                path_filter = PathFilter(w.directory, w.include_globs, w.exclude_globs, w.use_ignore_files)
+            # Listing a large tree takes seconds, so it runs in a thread and the watcher starts once it is done
+            self.snapshot_worker = SnapshotWorker(w, self.search_engine.common_excludes, path_filter)
+            self.snapshot_worker.snapshotted.connect(self.on_snapshotted)
+            self.snapshot_worker.start()
+
+    def on_snapshotted(self, search_worker, path_filter, snapshots):
+        self.snapshot_worker = None
+        # Drop snapshots of a search that has since been replaced, or taken after watching was turned off
+        if search_worker is not self.worker or not self.chk_watch.isChecked() or self.watcher is not None:
+            return
+        self.watcher = DirectoryWatcher(search_worker.directory, self.search_engine.common_excludes, path_filter, snapshots, self)
+        self.watcher.files_changed.connect(self.on_files_changed)
+
+    def stop_watching(self):
+        if self.snapshot_worker is not None:
+            # Stops between folders, so this waits for one listing at most
+            self.snapshot_worker.stop_event.set()
+            self.snapshot_worker.wait()
+            self.snapshot_worker = None
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher.deleteLater()
+            self.watcher = None
+        self.pending_rescan = []
+        if self.rescan_worker is not None:
+            self.rescan_worker.stop_event.set()
+
+    def on_files_changed(self, paths):
+        self.pending_rescan.extend(paths)
+        if self.rescan_worker is None or not self.rescan_worker.isRunning():
+            self.start_rescan()
+
+    def start_rescan(self):
+        paths = list(dict.fromkeys(self.pending_rescan))
+        self.pending_rescan = []
+        if not paths or self.worker is None:
+            return
+        self.rescan_worker = RescanWorker(self.worker, paths)
+        self.rescan_worker.rescanned.connect(self.on_rescanned)
+        self.rescan_worker.start()
+
+    def on_rescanned(self, search_worker, changes):
+        # Drop updates that belong to a search that has since been replaced
+        if search_worker is not self.worker or self.watcher is None:
+            return
+        self.results_model.update_results(changes)
+        # Same limits and ordering as the search: best files only, at most max_results, in the table's sort order
+        self.results_model.limit_results(search_worker.top_k, search_worker.max_results)
+        header = self.table_results.horizontalHeader()
+        self.table_results.sortByColumn(header.sortIndicatorSection(), header.sortIndicatorOrder())
+        shown = self.lbl_filepath.text()
+        if changes.get(shown):
+            self.load_file_from_result(changes[shown])
+        self.lbl_status.setText(f"Watching. {len(changes)} changed files rescanned, {self.results_model.rowCount()} results.")
+        self.start_rescan()
+
     def show_error(self, msg):
         QMessageBox.critical(self, "Error", msg)
 
     def load_file_from_selected_row(self):
-        selected_items = self.table_results.selectedItems()
-        if not selected_items:
+        selected_rows = self.table_results.selectionModel().selectedRows()
+        if not selected_rows:
             return
-        # The data is attached to the first item in the row
-        row = selected_items[0].row()
-        name_item = self.table_results.item(row, 0)
-        result = name_item.data(Qt.ItemDataRole.UserRole)
+        result = self.results_model.result(selected_rows[0].row())
         if result:
             self.load_file_from_result(result)
 
@@ -766,41 +1449,36 @@ class MainWindow(QMainWindow):
         self.btn_open_external.setEnabled(True)
         self.btn_reveal_explorer.setEnabled(True)
         self.btn_open_system.setEnabled(True)
+        self.close_large_preview()
 
         try:
-            # Check if file is likely binary
-            binary_extensions = {'.exe', '.dll', '.so', '.bin', '.jpg', '.png', '.gif', '.mp4', '.zip', '.7z', '.rar'}
-            _, ext = os.path.splitext(filepath.lower())
-            
-            is_binary = ext in binary_extensions
+            is_binary = False
+            is_large = False
             content = ""
-            
-            if not is_binary:
-                try:
-                    if filepath.lower().endswith('.docx'):
-                        lines = self.search_engine._extract_text_from_docx(filepath)
-                        content = "\n".join(lines)
-                    elif filepath.lower().endswith('.xlsx'):
-                        lines = self.search_engine._extract_text_from_xlsx(filepath)
-                        content = "\n".join(lines)
-                    elif filepath.lower().endswith('.pdf'):
-                        lines = self.search_engine._extract_text_from_pdf(filepath)
-                        content = "\n".join(lines)
-                    else:
-                        with open(filepath, 'r', encoding='utf-8', errors='strict') as f:
-                            # Read first 1024 bytes to check for nulls (rudimentary binary check)
-                            chunk = f.read(1024)
-                            if '\0' in chunk:
-                                is_binary = True
-                            else:
-                                f.seek(0)
-                                content = f.read()
-                except (UnicodeDecodeError, PermissionError):
+
+            if 'error' in result:
+                # The search already gave up on this document; retrying here would block the UI
+                lines = [f"--- Could Not Search This File ---", "", f"Path: {filepath}", "", result['error']]
+            else:
+                lines = self.search_engine.extract_text(filepath, preview=True)
+            if lines is not None:
+                content = "\n".join(lines)
+            elif os.path.getsize(filepath) > self.preview_window_threshold:
+                # Only a window of lines is loaded; never read a big file whole on the UI thread
+                is_large = self.search_engine.is_large_text_file(filepath, self.preview_window_threshold)
+                is_binary = not is_large
+            else:
+                # Shared classification: extension deny-list, BOM/NUL sniffing and decoding in one read
+                content = self.search_engine.read_text(filepath, max_size=None)
+                if content is None:
                     is_binary = True
 
             if is_binary:
                 self.text_editor.setPlainText(f"--- Non-Text File ---\n\nPath: {filepath}\n\nThis file appears to be a binary or non-UTF-8 file. Use 'Open with System' to view it in its default application.")
                 self.highlighter.set_file("") # Clear highlighting
+            elif is_large:
+                self.open_large_preview(filepath)
+                self.highlighter.set_file(filepath)
             else:
                 self.text_editor.setPlainText(content)
                 self.highlighter.set_file(filepath)
@@ -822,6 +1500,7 @@ class MainWindow(QMainWindow):
             self.text_editor.setPlainText(f"Error reading file: {e}")
 
         # Handle matches
+        self.current_result = result
         self.current_matches = []
         self.current_match_index = -1
         self.lbl_match_info.setText("")
@@ -846,15 +1525,67 @@ class MainWindow(QMainWindow):
             self.update_match_buttons()
             self.highlight_current_match()
 
+    def open_large_preview(self, filepath):
+        self.preview_index = LineIndex(filepath)
+        # Offsets for the rest of the file are collected in the background for paging
+        threading.Thread(target=self.preview_index.build, daemon=True).start()
+        self.load_preview_window(0)
+
+    def close_large_preview(self):
+        if self.preview_index:
+            self.preview_index.cancelled = True
+            self.preview_index = None
+        self.text_editor.set_line_offset(0)
+
+    def load_preview_window(self, start, top_line=None):
+        """Shows preview_window_lines lines from start, keeping the absolute line top_line at the top of the view."""
+        start = max(0, start)
+        lines = self.preview_index.read_lines(start, self.preview_window_lines)
+        self.preview_loading = True
+        try:
+            self.text_editor.set_line_offset(start)
+            self.text_editor.setPlainText("\n".join(lines))
+            self.highlighter.relex()
+            self.preview_start = start
+            self.preview_count = len(lines)
+            if top_line is not None:
+                self.text_editor.verticalScrollBar().setValue(top_line - start)
+        finally:
+            self.preview_loading = False
+
+    def ensure_preview_line(self, line_index):
+        """Returns the block number of an absolute line, paging the preview window to it if needed."""
+        if self.preview_index is None:
+            return line_index
+        if not self.preview_start <= line_index < self.preview_start + self.preview_count:
+            self.load_preview_window(line_index - self.preview_window_lines // 2)
+        return line_index - self.preview_start
+
+    def on_preview_scrolled(self, value):
+        if self.preview_index is None or self.preview_loading:
+            return
+        bar = self.text_editor.verticalScrollBar()
+        margin = self.preview_window_lines // 10
+        top_line = self.preview_start + value
+        if value >= bar.maximum() - margin and self.preview_count == self.preview_window_lines:
+            # Near the bottom of the window and the file goes on: page forward
+            self.load_preview_window(self.preview_start + self.preview_window_lines // 2, top_line)
+        elif value <= margin and self.preview_start > 0:
+            self.load_preview_window(self.preview_start - self.preview_window_lines // 2, top_line)
+
     def update_match_buttons(self):
         count = len(self.current_matches)
+        location = None
+        if count:
+            location = match_location(self.current_result, self.current_matches[self.current_match_index])
+        location_info = f" ({location})" if location is not None else ""
         if count > 1:
             self.btn_prev_match.setEnabled(True)
             self.btn_next_match.setEnabled(True)
             self.btn_goto_match.setEnabled(True)
-            self.lbl_match_info.setText(f"Match {self.current_match_index + 1} of {count}")
+            self.lbl_match_info.setText(f"Match {self.current_match_index + 1} of {count}{location_info}")
         elif count == 1:
-            self.lbl_match_info.setText("1 Match")
+            self.lbl_match_info.setText(f"1 Match{location_info}")
             self.btn_prev_match.setEnabled(False)
             self.btn_next_match.setEnabled(False)
             self.btn_goto_match.setEnabled(True)
@@ -874,19 +1605,24 @@ class MainWindow(QMainWindow):
         match = self.current_matches[self.current_match_index]
         line_index = match[2]
 
-        block = self.text_editor.document().findBlockByNumber(line_index)
+        block = self.text_editor.document().findBlockByNumber(self.ensure_preview_line(line_index))
         if block.isValid():
             cursor = QTextCursor(block)
-            
-            # If we have precise span information (from regex), select the match exactly
+
+            if len(match) == 3 and self.worker and not self.worker.use_regex:
+                # Fuzzy matches carry no span; align the query against the shown line only
+                # when the match is viewed, and keep the span for the next visit
+                span = self.search_engine.fuzzy_span(self.worker.query, block.text(), self.worker.case_sensitive)
+                if span:
+                    match = match + (span,)
+                    self.current_matches[self.current_match_index] = match
+
+            # If we have precise span information, select the match exactly.
+            # Multiline matches simply extend the selection into the following blocks.
             if len(match) > 3 and isinstance(match[3], tuple):
                 start, end = match[3]
                 cursor.movePosition(QTextCursor.MoveOperation.Right, QTextCursor.MoveMode.MoveAnchor, start)
                 cursor.movePosition(QTextCursor.MoveOperation.Right, QTextCursor.MoveMode.KeepAnchor, end - start)
-            else:
-                # Fallback for fuzzy matches: highlight the whole line if no span is provided
-                # Future improvement: try to find the best match within the line
-                pass
             
             self.text_editor.setTextCursor(cursor)
             self.text_editor.centerCursor()
@@ -916,7 +1652,7 @@ class MainWindow(QMainWindow):
 
         # Get current line number (1-indexed)
         cursor = self.text_editor.textCursor()
-        line_number = cursor.blockNumber() + 1
+        line_number = cursor.blockNumber() + 1 + self.text_editor.line_offset
 
         try:
             editor_name = os.path.basename(self.editor_path).lower()
@@ -977,6 +1713,23 @@ class MainWindow(QMainWindow):
         self.settings.setValue("office", self.chk_office.isChecked())
         self.settings.setValue("case_sensitive", self.chk_case.isChecked())
         self.settings.setValue("limit_per_file", self.spin_limit_per_file.value())
+        self.settings.setValue("use_index", self.chk_index.isChecked())
+        self.settings.setValue("use_cache", self.chk_cache.isChecked())
+        self.settings.setValue("workers", self.spin_workers.value())
+        self.settings.setValue("io_threads", self.spin_io_threads.value())
+        self.settings.setValue("extract_timeout", self.spin_extract_timeout.value())
+        self.settings.setValue("multiline", self.chk_multiline.isChecked())
+        self.settings.setValue("collect_stats", self.chk_stats.isChecked())
+        self.settings.setValue("top_k", self.spin_top_k.value())
+        self.settings.setValue("max_results", self.spin_max_results.value())
+        self.settings.setValue("include_globs", self.entry_include.text())
+        self.settings.setValue("exclude_globs", self.entry_exclude.text())
+        self.settings.setValue("use_ignore_files", self.chk_ignore_files.isChecked())
+        self.settings.setValue("scan_order", SCAN_ORDERS[self.combo_scan_order.currentIndex()])
+        self.settings.setValue("pinned_folder", self.entry_pinned.text())
+        self.settings.setValue("large_files", self.chk_large_files.isChecked())
+        self.settings.setValue("large_file_mb", self.spin_large_file_mb.value())
+        self.settings.setValue("watch", self.chk_watch.isChecked())
         self.settings.setValue("app_theme", self.combo_app_theme.currentText())
         self.settings.setValue("syntax_theme", self.combo_syntax_theme.currentText())
         self.settings.setValue("editor_path", self.editor_path)
@@ -1010,6 +1763,59 @@ class MainWindow(QMainWindow):
         limit_per_file = self.settings.value("limit_per_file", 0, type=int)
         self.spin_limit_per_file.setValue(limit_per_file)
 
+        use_index = self.settings.value("use_index", False, type=bool)
+        self.chk_index.setChecked(use_index)
+
+        use_cache = self.settings.value("use_cache", False, type=bool)
+        self.chk_cache.setChecked(use_cache)
+
+        workers = self.settings.value("workers", 1, type=int)
+        self.spin_workers.setValue(workers)
+
+        io_threads = self.settings.value("io_threads", 0, type=int)
+        self.spin_io_threads.setValue(io_threads)
+
+        extract_timeout = self.settings.value("extract_timeout", 30, type=int)
+        self.spin_extract_timeout.setValue(extract_timeout)
+        self.search_engine.extraction_timeout = extract_timeout
+
+        multiline = self.settings.value("multiline", False, type=bool)
+        self.chk_multiline.setChecked(multiline)
+
+        collect_stats = self.settings.value("collect_stats", False, type=bool)
+        self.chk_stats.setChecked(collect_stats)
+
+        top_k = self.settings.value("top_k", 0, type=int)
+        self.spin_top_k.setValue(top_k)
+
+        max_results = self.settings.value("max_results", 0, type=int)
+        self.spin_max_results.setValue(max_results)
+
+        include_globs = self.settings.value("include_globs", "")
+        self.entry_include.setText(include_globs)
+
+        exclude_globs = self.settings.value("exclude_globs", "")
+        self.entry_exclude.setText(exclude_globs)
+
+        use_ignore_files = self.settings.value("use_ignore_files", False, type=bool)
+        self.chk_ignore_files.setChecked(use_ignore_files)
+
+        scan_order = self.settings.value("scan_order", "walk")
+        if scan_order in SCAN_ORDERS:
+            self.combo_scan_order.setCurrentIndex(SCAN_ORDERS.index(scan_order))
+
+        pinned_folder = self.settings.value("pinned_folder", "")
+        self.entry_pinned.setText(pinned_folder)
+
+        large_files = self.settings.value("large_files", False, type=bool)
+        self.chk_large_files.setChecked(large_files)
+
+        large_file_mb = self.settings.value("large_file_mb", 1, type=int)
+        self.spin_large_file_mb.setValue(large_file_mb)
+
+        watch = self.settings.value("watch", False, type=bool)
+        self.chk_watch.setChecked(watch)
+
         app_theme = self.settings.value("app_theme", "Dark")
         self.combo_app_theme.setCurrentText(app_theme)
         self.apply_app_theme(app_theme)
@@ -1021,6 +1827,7 @@ class MainWindow(QMainWindow):
     def closeEvent(self, event):
         self.save_settings()
         self.stop_search()
+        self.stop_watching()
         event.accept()
 
     def apply_app_theme(self, theme_name):
@@ -1289,6 +2096,9 @@ class MainWindow(QMainWindow):
         self.highlighter.set_style(style_name)
 
 if __name__ == '__main__':
+    # Required for the search process pool in frozen (PyInstaller) builds
+    multiprocessing.freeze_support()
+
     # Fix for Windows taskbar icon
     if sys.platform == 'win32':
         import ctypes
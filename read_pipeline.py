@@ -0,0 +1,95 @@
+import queue
+import threading
+
+# Marks the end of a stage's output
+_DONE = object()
+
+
+class ReadPipeline:
+    """
+    Staged file loading for a search: a traversal thread feeds paths into a bounded queue,
+    a pool of reader threads loads each file (stat, open, read, decode) into a second bounded
+    queue, and iterating the pipeline yields (path, loaded) pairs for the caller's thread to
+    match. A full queue blocks the stage before it, so memory stays bounded and disk waits
+    overlap with matching. Files come out in completion order, not walk order.
+    """
+
+    def __init__(self, paths, load, threads=4, stop_event=None, queue_size=64):
+        self.paths = paths
+        self.load = load
+        self.threads = max(1, threads)
+        self.stop_event = stop_event
+        self.path_queue = queue.Queue(queue_size)
+        self.loaded_queue = queue.Queue(queue_size)
+        self.closed = threading.Event()
+
+    def depths(self):
+        """Current number of items waiting in each queue."""
+        return {'paths': self.path_queue.qsize(), 'loaded': self.loaded_queue.qsize()}
+
+    def close(self):
+        """Stops all stages; threads blocked on a full queue give up within 0.1 s."""
+        self.closed.set()
+
+    def _stopped(self):
+        return self.closed.is_set() or (self.stop_event is not None and self.stop_event.is_set())
+
+    def _put(self, q, item):
+        """Waits for room in q; returns False if the pipeline stopped meanwhile."""
+        while not self._stopped():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _traverse(self):
+        try:
+            for path in self.paths:
+                if not self._put(self.path_queue, path):
+                    return
+        except Exception as e:
+            print(f"Error walking directory: {e}")
+        finally:
+            # One end marker per reader
+            for _ in range(self.threads):
+                self._put(self.path_queue, _DONE)
+
+    def _read(self):
+        try:
+            while not self._stopped():
+                try:
+                    path = self.path_queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if path is _DONE:
+                    break
+                try:
+                    loaded = self.load(path)
+                except Exception as e:
+                    print(f"Error reading {path}: {e}")
+                    continue
+                if not self._put(self.loaded_queue, (path, loaded)):
+                    return
+        finally:
+            self._put(self.loaded_queue, _DONE)
+
+    def __iter__(self):
+        stages = [threading.Thread(target=self._traverse, daemon=True)]
+        stages += [threading.Thread(target=self._read, daemon=True) for _ in range(self.threads)]
+        for stage in stages:
+            stage.start()
+        running = self.threads
+        try:
+            while running and not self._stopped():
+                try:
+                    item = self.loaded_queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is _DONE:
+                    running -= 1
+                    continue
+                yield item
+        finally:
+            self.close()
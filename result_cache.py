@@ -0,0 +1,83 @@
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+
+class ResultCache:
+    """
+    Least-recently-used cache of search results, keyed by the query and its options.
+    Each entry keeps a snapshot of (size, mtime) per file so a rerun only rescans the files
+    that changed. Memory is bounded by max_entries and by the total number of cached match
+    lines; with a path the cache is also pickled to disk and survives restarts.
+    """
+
+    def __init__(self, path=None, max_entries=16, max_matches=200000):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_matches = max_matches
+        self.entries = OrderedDict()
+        self.loaded = path is None
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _size(entry):
+        return sum(len(result.get('matches', ())) for result in entry['results'].values())
+
+    def _load(self):
+        # Loaded on first use so pool processes that never consult the cache pay nothing
+        self.loaded = True
+        try:
+            with open(self.path, 'rb') as f:
+                entries = pickle.load(f)
+            if isinstance(entries, OrderedDict):
+                self.entries = entries
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error reading result cache: {e}")
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(self.entries, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"Error writing result cache: {e}")
+
+    def get(self, key):
+        """Returns the cached entry ({'snapshot': {path: (size, mtime_ns)}, 'results': {path: result}}) or None."""
+        with self.lock:
+            if not self.loaded:
+                self._load()
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, snapshot, results):
+        """Stores the results of a finished search and evicts the oldest entries past the bounds."""
+        entry = {'snapshot': snapshot, 'results': results}
+        size = self._size(entry)
+        with self.lock:
+            if not self.loaded:
+                self._load()
+            self.entries.pop(key, None)
+            if size > self.max_matches:
+                return
+            self.entries[key] = entry
+            total = sum(self._size(e) for e in self.entries.values())
+            while len(self.entries) > self.max_entries or total > self.max_matches:
+                _, oldest = self.entries.popitem(last=False)
+                total -= self._size(oldest)
+            if self.path:
+                self._save()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.loaded = True
+            if self.path:
+                self._save()
@@ -0,0 +1,116 @@
+import os
+import heapq
+import threading
+
+# Scan orders offered by the sidebar and the command line
+SCAN_ORDERS = ('walk', 'recent', 'smallest')
+
+
+def scan_priority(order, size, mtime_ns):
+    """Sort key of a file for a scan order; lower is searched sooner."""
+    if order == 'recent':
+        return -mtime_ns
+    if order == 'smallest':
+        return size
+    return 0
+
+
+def in_folder(path, folder):
+    return folder is not None and (path == folder or path.startswith(folder + os.sep))
+
+
+def order_paths(paths, order, pinned=None, signatures=None):
+    """
+    Sorts an already known list of paths (index candidates, changed files) for a scan order.
+    signatures maps path -> (size, mtime_ns); missing entries are stat'ed.
+    """
+    if order == 'walk' and pinned is None:
+        return paths
+
+    def key(path):
+        signature = signatures.get(path) if signatures else None
+        if signature is None:
+            try:
+                st = os.stat(path)
+                signature = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                signature = (0, 0)
+        return (not in_folder(path, pinned), scan_priority(order, *signature))
+
+    return sorted(paths, key=key)
+
+
+class ScanScheduler:
+    """
+    Reorders the files of a directory walk so the likeliest-wanted ones are searched first.
+    The walk runs in a background thread and feeds a bounded priority queue, and the search
+    pops the best file seen so far, so matching overlaps traversal and memory stays bounded.
+    The order is exact within each window of `capacity` files and approximate across the tree.
+    Files under the pinned folder (walked first by DirectoryScanner) always rank ahead.
+    """
+
+    def __init__(self, scanner, order='recent', pinned=None, capacity=16384, prime_seconds=0.05):
+        self.scanner = scanner
+        self.order = order
+        self.pinned = pinned
+        self.capacity = capacity
+        # The first pop waits this long (or until the queue is full) so early picks have a choice
+        self.prime_seconds = prime_seconds
+        self.heap = []
+        self.cond = threading.Condition()
+        self.done = False
+        self.closed = False
+        self.error = None
+
+    def _priority(self, entry):
+        if self.order == 'walk':
+            metric = 0
+        else:
+            try:
+                st = entry.stat()
+                metric = scan_priority(self.order, st.st_size, st.st_mtime_ns)
+            except OSError:
+                metric = 0
+        return (not in_folder(entry.path, self.pinned), metric)
+
+    def _produce(self):
+        try:
+            for seq, entry in enumerate(self.scanner):
+                item = (self._priority(entry), seq, entry.path)
+                with self.cond:
+                    while len(self.heap) >= self.capacity and not self.closed:
+                        self.cond.wait()
+                    if self.closed:
+                        return
+                    heapq.heappush(self.heap, item)
+                    self.cond.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            with self.cond:
+                self.done = True
+                self.cond.notify_all()
+
+    def __iter__(self):
+        producer = threading.Thread(target=self._produce, daemon=True)
+        producer.start()
+        try:
+            with self.cond:
+                self.cond.wait_for(lambda: self.done or len(self.heap) >= self.capacity, timeout=self.prime_seconds)
+            stop_event = self.scanner.stop_event
+            while not (stop_event and stop_event.is_set()):
+                with self.cond:
+                    # The scanner checks the stop event itself, so done is always reached
+                    self.cond.wait_for(lambda: self.heap or self.done)
+                    if not self.heap:
+                        break
+                    _, _, path = heapq.heappop(self.heap)
+                    self.cond.notify_all()
+                yield path
+            if self.error is not None:
+                raise self.error
+        finally:
+            with self.cond:
+                self.closed = True
+                self.heap = []
+                self.cond.notify_all()
@@ -1,174 +1,1739 @@
 import os
+import io
+import mmap
+import codecs
+import time
+import heapq
+import threading
+import zipfile
+import multiprocessing
+from bisect import bisect_right
+from xml.etree import ElementTree
 from rapidfuzz import process, fuzz
 import re
+from itertools import islice, chain
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from trigram_index import TrigramIndex, required_grams, default_cache_dir
+from extraction_cache import ExtractionCache
+from result_cache import ResultCache
+from search_stats import SearchStats
+from ignore_rules import PathFilter
+from scan_scheduler import ScanScheduler, order_paths
+from read_pipeline import ReadPipeline
+from extraction_pool import ExtractionPool, ExtractionError
+
+try:
+    import numpy as np # Optional: enables multi-threaded cdist scoring of fuzzy batches
+except ImportError:
+    np = None
+
+
+class DirectoryScanner:
+    """
+    Single-pass os.scandir traversal that yields file entries as soon as they are listed
+    and keeps a running estimate of the total number of files for progress reporting.
+    """
+
+    def __init__(self, directory, excludes, stop_event=None, expected_total=0, stats=None, path_filter=None, first=None):
+        self.directory = directory
+        self.excludes = excludes
+        self.stop_event = stop_event
+        self.expected_total = expected_total
+        self.stats = stats
+        # Optional ignore_rules.PathFilter; ignored folders are pruned before they are listed
+        self.path_filter = path_filter
+        # Optional subfolder of directory that is walked before everything else
+        self.first = first
+        self.files_seen = 0
+        self.dirs_done = 0
+        self.pending_dirs = 0
+
+    def estimate(self):
+        """Best guess of the total file count, refined as directories are listed."""
+        if self.expected_total:
+            return max(self.expected_total, self.files_seen)
+        if not self.dirs_done:
+            return 0
+        # Assume the directories still queued hold as many files as the ones listed so far
+        per_dir = self.files_seen / self.dirs_done
+        return self.files_seen + int(self.pending_dirs * per_dir)
+
+    def __iter__(self):
+        # The stack is popped from the end, so a pinned folder's whole subtree comes first
+        stack = [self.directory, self.first] if self.first else [self.directory]
+        while stack:
+            if self.stop_event and self.stop_event.is_set():
+                return
+            path = stack.pop()
+            self.pending_dirs = len(stack)
+            if self.stats is not None:
+                listed = time.perf_counter()
+            try:
+                with os.scandir(path) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+
+            path_filter = self.path_filter
+            if path_filter is not None:
+                # Reads this folder's .gitignore/.ignore, if the listing has one
+                path_filter.load(path.rstrip(os.sep) or path, {entry.name for entry in entries})
+
+            subdirs = []
+            files = []
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    # Like os.walk, symlinked directories are not followed
+                    if entry.name not in self.excludes and not entry.is_symlink():
+                        if entry.path == self.first:
+                            continue # Already walked
+                        if path_filter is not None and path_filter.skip_dir(entry.path):
+                            if self.stats is not None:
+                                self.stats.skip('ignored')
+                            continue
+                        subdirs.append(entry.path)
+                    elif self.stats is not None and entry.name in self.excludes:
+                        self.stats.skip('excluded')
+                elif path_filter is not None and path_filter.skip_file(entry.path):
+                    if self.stats is not None:
+                        self.stats.skip('ignored')
+                else:
+                    files.append(entry)
+            if self.stats is not None:
+                self.stats.add_time('walk', time.perf_counter() - listed)
+
+            # Push in reverse so directories are visited in listing order, like os.walk
+            stack.extend(reversed(subdirs))
+            self.pending_dirs = len(stack)
+            self.dirs_done += 1
+            self.files_seen += len(files)
+
+            for entry in files:
+                yield entry
+
+
+# Files above this size are skipped unless large-file mode is on
+DEFAULT_LARGE_FILE_THRESHOLD = 1024 * 1024
+
+# Line ends of raw (memory-mapped) files, which are not newline-translated like decoded text
+_LINE_END = re.compile(rb'\r\n?|\n')
+
 
 class SearchEngine:
-    def __init__(self):
+    office_extensions = ('.docx', '.xlsx', '.pdf')
+    # Extensions that are never opened as text
+    binary_extensions = {'.exe', '.dll', '.so', '.bin', '.jpg', '.png', '.gif', '.mp4', '.zip', '.7z', '.rar'}
+    parallel_chunk_size = 64
+    # Bytes of a memory-mapped file handled per step in large-file mode
+    large_file_chunk_size = 16 * 1024 * 1024
+    # Text files above this size are read and matched this many characters at a time
+    stream_chunk_size = 256 * 1024
+    # Number of files whose text/binary classification is remembered
+    classification_cache_size = 200000
+    # A fuzzy batch is scored once it holds this many lines or has been filling this long (seconds)
+    fuzzy_batch_lines = 100000
+    fuzzy_batch_interval = 0.25
+    # Office/PDF extraction runs in separate processes with these limits; False extracts in-process
+    isolate_extraction = True
+    extraction_timeout = 30
+    extraction_memory_mb = 1024
+    extraction_workers = max(2, min(4, os.cpu_count() or 1))
+    # PDFs above this size have their pages split across all extraction processes
+    parallel_pdf_bytes = 4 * 1024 * 1024
+    # Word and Excel text is streamed to the matcher in blocks of this many lines
+    extraction_block_lines = 2000
+    # Documents with more extracted text (characters) than this are searched without being cached
+    cache_text_limit = 8 * 1024 * 1024
+
+    def __init__(self, cache_dir=None):
         self.common_excludes = {'.git', 'node_modules', '__pycache__', 'venv', '.idea', '.vscode', 'dist', 'build'}
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.extraction_cache = ExtractionCache(self.cache_dir)
+        # In-memory by default; replace with ResultCache(path) to keep results across restarts
+        self.result_cache = ResultCache()
+        # SearchStats of the running search when collect_stats is on, otherwise None
+        self.stats = None
+        self.last_stats = None
+        # stop_event of the running search; also cancels a document extraction in progress
+        self.stop_event = None
+        self.extraction_pool = None
+        # Reader threads may all reach their first document at once
+        self._extraction_pool_lock = threading.Lock()
+        # path -> ((size, mtime_ns), encoding or None for binary)
+        self._classifications = {}
+        self._classifications_lock = threading.Lock()
+
+    def _sniff_encoding(self, data):
+        """Picks the encoding of a file from its leading bytes, or returns None if it looks binary."""
+        if data.startswith(codecs.BOM_UTF8):
+            return 'utf-8-sig'
+        if data.startswith((codecs.BOM_UTF32_LE, codecs.BOM_UTF32_BE)):
+            return 'utf-32'
+        if data.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+            return 'utf-16'
+
+        head = data[:1024]
+        if b'\0' in head:
+            return None
+        try:
+            head.decode('utf-8')
+        except UnicodeDecodeError as e:
+            # Tolerate a multi-byte character cut off at the end of the sample
+            if e.start < len(head) - 3:
+                return None
+        return 'utf-8'
+
+    def _remember_classification(self, filepath, key, encoding):
+        with self._classifications_lock:
+            self._classifications.pop(filepath, None)
+            self._classifications[filepath] = (key, encoding)
+            if len(self._classifications) > self.classification_cache_size:
+                # Dicts keep insertion order, so the first entry is the least recently classified
+                del self._classifications[next(iter(self._classifications))]
+
+    def _check_text(self, filepath, max_size, st):
+        """
+        The cheap checks before a file is opened as text: extension, size and cached classification.
+        Returns (stat_result, classification cache key, cached encoding or None if unknown),
+        or None if the file is skipped.
+        """
+        stats = self.stats
+        if os.path.splitext(filepath)[1].lower() in self.binary_extensions:
+            if stats is not None:
+                stats.skip('binary')
+            return None
+        try:
+            if st is None:
+                st = os.stat(filepath)
+        except OSError:
+            if stats is not None:
+                stats.skip('unreadable')
+            return None
+        if max_size is not None and st.st_size > max_size:
+            if stats is not None:
+                stats.skip('too_large')
+            return None
+
+        key = (st.st_size, st.st_mtime_ns)
+        cached = self._classifications.get(filepath)
+        if cached and cached[0] == key:
+            if cached[1] is None:
+                if stats is not None:
+                    stats.skip('binary')
+                return None
+            return st, key, cached[1]
+        return st, key, None
+
+    def _classify(self, filepath, key, head):
+        """Sniffs and remembers the encoding of a file from its first bytes; None means binary."""
+        encoding = self._sniff_encoding(head)
+        self._remember_classification(filepath, key, encoding)
+        if encoding is None and self.stats is not None:
+            self.stats.skip('binary' if b'\0' in head[:1024] else 'decode_error')
+        return encoding
+
+    def read_text(self, filepath, max_size=DEFAULT_LARGE_FILE_THRESHOLD, st=None):
+        """
+        Reads a file once and returns its decoded text, or None if it is binary, too large or unreadable.
+        The binary/encoding decision is cached per (path, size, mtime), so known binaries are not reopened.
+        """
+        checked = self._check_text(filepath, max_size, st)
+        if checked is None:
+            return None
+        st, key, encoding = checked
+
+        stats = self.stats
+        if stats is not None:
+            started = time.perf_counter()
+        try:
+            with open(filepath, 'rb') as f:
+                data = f.read()
+        except OSError:
+            if stats is not None:
+                stats.skip('unreadable')
+            return None
+        if stats is not None:
+            stats.add_time('read', time.perf_counter() - started)
+            stats.add_bytes(len(data))
 
-    def is_text_file(self, filepath):
+        if encoding is None:
+            encoding = self._classify(filepath, key, data)
+            if encoding is None:
+                return None
+
+        if stats is not None:
+            started = time.perf_counter()
+        text = data.decode(encoding, errors='ignore')
+        # Match text-mode universal newlines so line numbers agree with the preview
+        if '\r' in text:
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+        if stats is not None:
+            stats.add_time('decode', time.perf_counter() - started)
+        return text
+
+    def iter_text_blocks(self, filepath, max_size=DEFAULT_LARGE_FILE_THRESHOLD, st=None, chunk_size=256 * 1024):
+        """
+        Streams a text file as blocks of whole lines, decoded and newline-normalised like read_text,
+        reading chunk_size characters at a time so memory per file stays bounded. Yields nothing for
+        binary, too large or unreadable files. Closing the generator early stops reading.
+        """
+        checked = self._check_text(filepath, max_size, st)
+        if checked is None:
+            return
+        st, key, encoding = checked
+
+        stats = self.stats
+        try:
+            f = open(filepath, 'rb')
+        except OSError:
+            if stats is not None:
+                stats.skip('unreadable')
+            return
+        try:
+            if encoding is None:
+                # Same sample as read_text: BOMs and the first KB decide
+                encoding = self._classify(filepath, key, f.read(1024))
+                if encoding is None:
+                    return
+                f.seek(0)
+            # Universal newlines, carried correctly across chunk boundaries
+            text = io.TextIOWrapper(f, encoding=encoding, errors='ignore', newline=None)
+            pending = ''
+            while True:
+                if stats is not None:
+                    # Only the reads are timed; the caller matches between yields
+                    started = time.perf_counter()
+                    chunk = text.read(chunk_size)
+                    stats.add_time('read', time.perf_counter() - started)
+                else:
+                    chunk = text.read(chunk_size)
+                if not chunk:
+                    break
+                pending += chunk
+                cut = pending.rfind('\n') + 1
+                if cut:
+                    yield pending[:cut]
+                    pending = pending[cut:]
+            if pending:
+                yield pending
+        finally:
+            if stats is not None and not f.closed:
+                stats.add_bytes(f.tell())
+            f.close()
+
+    def is_text_file(self, filepath, max_size=DEFAULT_LARGE_FILE_THRESHOLD):
         """Simple check to avoid reading binary files."""
-        # Check size first (limit to 1MB)
+        if os.path.splitext(filepath)[1].lower() in self.binary_extensions:
+            return False
+        # Check size first (limit to 1MB by default)
         try:
-            if os.path.getsize(filepath) > 1024 * 1024:
+            if os.path.getsize(filepath) > max_size:
                 return False
+            with open(filepath, 'rb') as f:
+                return self._sniff_encoding(f.read(1024)) is not None
         except OSError:
             return False
 
+    def is_large_text_file(self, filepath, threshold=DEFAULT_LARGE_FILE_THRESHOLD, st=None):
+        """Returns True for files above threshold whose first KB looks like UTF-8 text."""
+        if os.path.splitext(filepath)[1].lower() in self.binary_extensions:
+            return False
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                f.read(1024)
-            return True
-        except (UnicodeDecodeError, Exception):
+            size = st.st_size if st is not None else os.path.getsize(filepath)
+            if size <= threshold:
+                return False
+            with open(filepath, 'rb') as f:
+                head = f.read(1024)
+        except OSError:
             return False
 
-    def _extract_text_from_docx(self, filepath):
-        """Extracts text from a .docx file."""
+        # The memory-mapped matchers work on raw UTF-8 bytes
+        return self._sniff_encoding(head) == 'utf-8'
+
+    # Document extractors yield (index, (section, lines, refs)) blocks: a sheet title (else None),
+    # up to extraction_block_lines non-blank lines and, for Word and Excel, a location per line
+
+    @staticmethod
+    def _iter_docx_blocks(filepath):
+        """
+        Yields blocks of the non-blank body paragraphs of a .docx file, with the paragraph number
+        of each line as its ref. The document XML is parsed incrementally and each paragraph is
+        dropped once read, so memory does not grow with the document.
+        """
+        try:
+            archive = zipfile.ZipFile(filepath)
+        except MemoryError:
+            raise # Reported by the extraction pool
+        except Exception as e:
+            print(f"Error extracting Word text: {e}")
+            return
+        index = 0
+        lines = []
+        refs = []
         try:
-            import docx
-            doc = docx.Document(filepath)
-            # Combine all paragraphs into a list of lines
-            lines = [p.text for p in doc.paragraphs if p.text.strip()]
-            return lines
+            with archive, archive.open(_docx_main_part(archive)) as source:
+                depth = 0
+                number = 0
+                for event, element in ElementTree.iterparse(source, ('start', 'end')):
+                    if event == 'start':
+                        depth += 1
+                        if depth == 2:
+                            body = element
+                        continue
+                    depth -= 1
+                    if depth != 2:
+                        continue
+                    # A direct child of the body: a paragraph, table or section break
+                    if element.tag == _W + 'p':
+                        number += 1
+                        text = _paragraph_text(element)
+                        if text.strip():
+                            lines.append(text)
+                            refs.append(number)
+                            if len(lines) >= SearchEngine.extraction_block_lines:
+                                yield index, (None, lines, refs)
+                                index += 1
+                                lines = []
+                                refs = []
+                    body.remove(element)
+        except MemoryError:
+            raise
         except Exception as e:
             print(f"Error extracting Word text: {e}")
-            return []
+        if lines:
+            yield index, (None, lines, refs)
 
-    def _extract_text_from_xlsx(self, filepath):
-        """Extracts text from a .xlsx file."""
+    @staticmethod
+    def _iter_xlsx_blocks(filepath):
+        """
+        Yields blocks of the non-blank rows of a .xlsx file, one sheet at a time. The ref of a line
+        is (row number, offset in the line, column number, offset, column, ...) for its non-empty cells.
+        Rows are read one at a time, so memory does not grow with the workbook.
+        """
         try:
             import openpyxl
             wb = openpyxl.load_workbook(filepath, data_only=True, read_only=True)
-            lines = []
+        except MemoryError:
+            raise # Reported by the extraction pool
+        except Exception as e:
+            print(f"Error extracting Excel text: {e}")
+            return
+        index = 0
+        try:
             for sheet in wb.worksheets:
-                for row in sheet.iter_rows(values_only=True):
-                    row_text = " ".join([str(cell) for cell in row if cell is not None])
+                lines = []
+                refs = []
+                for row_number, row in enumerate(sheet.iter_rows(values_only=True), 1):
+                    values = []
+                    ref = [row_number]
+                    offset = 0
+                    for column, cell in enumerate(row, 1):
+                        if cell is not None:
+                            value = str(cell)
+                            values.append(value)
+                            # Flat, so a location costs one small tuple per row
+                            ref += (offset, column)
+                            offset += len(value) + 1
+                    row_text = " ".join(values)
                     if row_text.strip():
                         lines.append(row_text)
-            return lines
+                        refs.append(tuple(ref))
+                        if len(lines) >= SearchEngine.extraction_block_lines:
+                            yield index, (sheet.title, lines, refs)
+                            index += 1
+                            lines = []
+                            refs = []
+                if lines:
+                    yield index, (sheet.title, lines, refs)
+                    index += 1
+        except MemoryError:
+            raise
         except Exception as e:
             print(f"Error extracting Excel text: {e}")
-            return []
+        finally:
+            wb.close()
 
-    def _extract_text_from_pdf(self, filepath):
-        """Extracts text from a .pdf file."""
+    @staticmethod
+    def _iter_pdf_pages(filepath, part=0, parts=1):
+        """
+        Yields one block per page of a .pdf file, for the pages whose index % parts == part,
+        so several processes can share one document. A page that fails to extract has no lines.
+        """
         try:
             from pypdf import PdfReader
             reader = PdfReader(filepath)
-            lines = []
-            for page in reader.pages:
-                text = page.extract_text()
-                if text:
-                    # Split into lines and filter out empty ones
-                    lines.extend([line for line in text.splitlines() if line.strip()])
-            return lines
+            count = len(reader.pages)
+        except MemoryError:
+            raise # Reported by the extraction pool
         except Exception as e:
             print(f"Error extracting PDF text: {e}")
-            return []
+            return
+        for index in range(part, count, parts):
+            try:
+                text = reader.pages[index].extract_text()
+            except MemoryError:
+                raise
+            except Exception as e:
+                print(f"Error extracting PDF text: {e}")
+                text = None
+            # Split into lines and filter out empty ones
+            yield index, (None, [line for line in text.splitlines() if line.strip()] if text else [], None)
+
+    @staticmethod
+    def _document_blocks(filepath):
+        """Returns the block generator function for a .docx/.xlsx/.pdf path, or None for other files."""
+        lower_file = filepath.lower()
+        if lower_file.endswith('.docx'):
+            return SearchEngine._iter_docx_blocks
+        if lower_file.endswith('.xlsx'):
+            return SearchEngine._iter_xlsx_blocks
+        if lower_file.endswith('.pdf'):
+            return SearchEngine._iter_pdf_pages
+        return None
+
+    def _walk_stats(self, directory, stop_event=None, path_filter=None):
+        """Yields (path, stat_result) for every file under directory, skipping excluded and filtered-out paths."""
+        for entry in DirectoryScanner(directory, self.common_excludes, stop_event, stats=self.stats, path_filter=path_filter):
+            try:
+                yield entry.path, entry.stat()
+            except OSError:
+                continue
+
+    def _indexed_paths(self, directory, query, stop_event, threshold, update_callback, use_regex, search_office, large_files=False, entries=None, path_filter=None,
+                       large_file_threshold=DEFAULT_LARGE_FILE_THRESHOLD):
+        """
+        Refreshes the trigram index for directory and returns the paths worth searching.
+        entries are (path, stat_result) pairs from an earlier, unfiltered walk; by default the directory is walked.
+        The index always covers the whole tree; path_filter is applied to the candidates.
+        """
+        if entries is None:
+            entries = self._walk_stats(directory, stop_event)
+        with TrigramIndex(directory, self.cache_dir) as index:
+            if update_callback:
+                update_callback(("Indexing", 0, 0))
+            # Files are indexed up to the same size limit the search reads them at
+            load_text = lambda path: self.read_text(path, large_file_threshold)
+            if not index.refresh(entries, load_text, stop_event, large_file_threshold):
+                return None
+
+            grams, min_shared = required_grams(query, use_regex, threshold)
+            paths = index.candidates(grams, min_shared)
+            if search_office:
+                paths.extend(p for p in index.unindexed() if p.lower().endswith(self.office_extensions))
+            if large_files:
+                # Only files up to the threshold are indexed, so larger ones are always scanned
+                paths.extend(index.unindexed(min_size=large_file_threshold))
+            if search_office or large_files:
+                paths = sorted(set(paths))
+            if path_filter is not None:
+                paths = [path for path in paths if path_filter.allows(path)]
+            return paths
+
+    def compile_query(self, query, case_sensitive=False, as_bytes=False):
+        """
+        Compiles a regex query once per search. Raises re.error for invalid patterns.
+        With as_bytes, the pattern is compiled for raw UTF-8 buffers (ASCII-only case folding).
+        """
+        # MULTILINE keeps ^ and $ anchored to line boundaries when matching whole buffers
+        flags = re.MULTILINE if case_sensitive else re.MULTILINE | re.IGNORECASE
+        if as_bytes:
+            return re.compile(query.encode('utf-8'), flags)
+        return re.compile(query, flags)
+
+    def fuzzy_span(self, query, line, case_sensitive=False):
+        """
+        Returns the (start, end) span of the best fuzzy alignment of query within line, or None.
+        Fuzzy results only carry line numbers; callers ask for the span of the matches they show.
+        """
+        if not case_sensitive:
+            query, line = query.lower(), line.lower()
+        alignment = fuzz.partial_ratio_alignment(query, line)
+        if alignment is None or alignment.dest_end <= alignment.dest_start:
+            return None
+        return (alignment.dest_start, alignment.dest_end)
+
+    def _regex_matches(self, content, pattern, limit_per_file=0, multiline=False):
+        """
+        Runs a compiled pattern over a whole decoded buffer and maps each match back to
+        (line text, 100, line index, span within the line) using newline offsets.
+        Unless multiline is set, matches are confined to a single line.
+        """
+        matches = []
+        line_no = 0
+        counted = 0
+        pos = 0
+        end_of_buffer = len(content)
+
+        def add(line_start, line_end, span):
+            matches.append((content[line_start:line_end].strip(), 100, line_no, span))
+            return limit_per_file > 0 and len(matches) >= limit_per_file
+
+        while pos <= end_of_buffer:
+            m = pattern.search(content, pos)
+            if not m:
+                break
+            start, end = m.span()
+            line_start = content.rfind('\n', 0, start) + 1
+            line_end = content.find('\n', start)
+            if line_end == -1:
+                line_end = end_of_buffer
+
+            # Count newlines incrementally; matches arrive in buffer order
+            line_no += content.count('\n', counted, line_start)
+            counted = line_start
+
+            if multiline or end <= line_end + 1:
+                if add(line_start, line_end, (start - line_start, end - line_start)):
+                    break
+                pos = end if end > start else end + 1
+            else:
+                # The match ran past its line: match that line on its own instead
+                line = content[line_start:line_end + 1]
+                done = False
+                for lm in pattern.finditer(line):
+                    if lm.start() < start - line_start:
+                        continue # Already added before the search reached this match
+                    if add(line_start, line_end, lm.span()):
+                        done = True
+                        break
+                if done:
+                    break
+                pos = line_end + 1
+        return matches
+
+    def _count_newlines(self, mm, start, end):
+        """
+        Counts line ends (\\n, \\r\\n or a lone \\r) in mm[start:end] without copying
+        more than one chunk at a time.
+        """
+        count = 0
+        step = self.large_file_chunk_size
+        for pos in range(start, end, step):
+            stop = min(pos + step, end)
+            chunk = mm[pos:stop]
+            count += chunk.count(b'\n')
+            returns = chunk.count(b'\r')
+            if returns:
+                count += returns - chunk.count(b'\r\n')
+                if chunk.endswith(b'\r') and stop < end and mm[stop:stop + 1] == b'\n':
+                    count -= 1 # A \r\n split between two chunks
+        return count
+
+    @staticmethod
+    def _line_bounds(mm, floor, pos, returns=True):
+        """
+        Returns (line start, line end, next line start) of the line holding byte pos, where
+        floor is a known line start at or before it. Unless returns is False (the file has
+        no \\r), lines may also end in \\r\\n or a lone \\r; a pos on the \\n of a \\r\\n
+        belongs to the line that \\r\\n ends.
+        """
+        if not returns:
+            line_end = mm.find(b'\n', pos)
+            if line_end == -1:
+                line_end = len(mm)
+            return mm.rfind(b'\n', floor, pos) + 1 or floor, line_end, line_end + 1
+        if pos > floor and mm[pos - 1:pos + 1] == b'\r\n':
+            pos -= 1
+        line_start = mm.rfind(b'\n', floor, pos) + 1 or floor
+        cr = mm.rfind(b'\r', line_start, pos)
+        if cr != -1:
+            line_start = cr + 1
+        m = _LINE_END.search(mm, pos)
+        if m is None:
+            return line_start, len(mm), len(mm)
+        return line_start, m.start(), m.end()
+
+    def _mmap_regex_matches(self, mm, pattern, limit_per_file=0, multiline=False):
+        """
+        Byte-level version of _regex_matches for memory-mapped files.
+        Only the lines that contain a match are decoded; spans are converted to characters.
+        """
+        returns = mm.find(b'\r') != -1
+        if returns:
+            # Lines may end in \r\n or \r; the rewritten pattern is slower, so only such files get it
+            query = _raw_line_pattern(pattern.pattern.decode('utf-8'), pattern.flags & re.DOTALL)
+            pattern = re.compile(query.encode('utf-8'), pattern.flags)
+        matches = []
+        line_no = 0
+        counted = 0
+        pos = 0
+        end_of_buffer = len(mm)
+
+        def add(line_start, line_end, start, end):
+            line = mm[line_start:line_end].decode('utf-8', errors='ignore')
+            # Byte offsets -> character offsets within the decoded line, each line end counting as one
+            span_start = len(mm[line_start:start].decode('utf-8', errors='ignore'))
+            span = mm[start:end]
+            if returns:
+                span = _LINE_END.sub(b'\n', span)
+            span_end = span_start + len(span.decode('utf-8', errors='ignore'))
+            matches.append((line.strip(), 100, line_no, (span_start, span_end)))
+            return limit_per_file > 0 and len(matches) >= limit_per_file
+
+        while pos <= end_of_buffer:
+            m = pattern.search(mm, pos)
+            if not m:
+                break
+            start, end = m.span()
+            line_start, line_end, next_line = self._line_bounds(mm, counted, start, returns)
+
+            line_no += self._count_newlines(mm, counted, line_start)
+            counted = line_start
+
+            if multiline or end <= next_line:
+                if add(line_start, line_end, start, end):
+                    break
+                pos = end if end > start else end + 1
+            else:
+                # The match ran past its line: match that line on its own instead
+                line = mm[line_start:next_line]
+                done = False
+                for lm in pattern.finditer(line):
+                    if lm.start() < start - line_start:
+                        continue # Already added before the search reached this match
+                    if add(line_start, line_end, line_start + lm.start(), line_start + lm.end()):
+                        done = True
+                        break
+                if done:
+                    break
+                pos = next_line
+        return matches
+
+    def _mmap_fuzzy_matches(self, mm, query, threshold, case_sensitive, limit_per_file=0):
+        """Scores a memory-mapped file chunk by chunk so only one chunk of lines is decoded at a time."""
+        fuzzy_limit = limit_per_file if limit_per_file > 0 else None
+        matches = []
+        line_base = 0
+        pos = 0
+        end_of_buffer = len(mm)
+
+        while pos < end_of_buffer:
+            end = min(pos + self.large_file_chunk_size, end_of_buffer)
+            if end < end_of_buffer:
+                # Cut the chunk after its last complete line
+                nl = max(mm.rfind(b'\n', pos, end), mm.rfind(b'\r', pos, end))
+                if nl != -1:
+                    end = nl + 2 if mm[nl:nl + 2] == b'\r\n' else nl + 1
+            # Lines keep their end, translated to \n, like the readlines() of the other paths
+            lines = io.StringIO(mm[pos:end].decode('utf-8', errors='ignore'), newline=None).readlines()
+            if end < end_of_buffer and lines and not lines[-1].endswith('\n'):
+                lines.pop() # Cut off by a line longer than the chunk
+
+            matches.extend(self._fuzzy_extract(query, lines, threshold, case_sensitive, fuzzy_limit, line_base))
+            line_base += len(lines)
+            pos = end
+            if fuzzy_limit:
+                # Keep only the best matches seen so far
+                self._rank(matches, fuzzy_limit)
+        return self._rank(matches)
+
+    def _search_large_file(self, filepath, query, threshold, large_pattern, case_sensitive, limit_per_file, multiline):
+        """Searches a file over the large-file threshold through a read-only memory map."""
+        try:
+            with open(filepath, 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    if large_pattern is not None:
+                        matches = self._mmap_regex_matches(mm, large_pattern, limit_per_file, multiline)
+                    else:
+                        matches = self._mmap_fuzzy_matches(mm, query, threshold, case_sensitive, limit_per_file)
+        except (OSError, ValueError) as e:
+            print(f"Error reading {filepath}: {e}")
+            return None
+        return self._result(filepath, matches) if matches else None
+
+    def _search_file(self, filepath, query, threshold, pattern, search_office, case_sensitive, limit_per_file,
+                     multiline=False, large_files=False, large_file_threshold=DEFAULT_LARGE_FILE_THRESHOLD, large_pattern=None):
+        """
+        Searches a single file and returns a result dict, or None if nothing matched.
+        pattern is the compiled regex in regex mode, or None for fuzzy matching.
+        With large_files, files over large_file_threshold are memory-mapped and matched
+        with large_pattern (the bytes version of pattern) instead of being skipped.
+        """
+        args = (filepath, query, threshold, pattern, search_office, case_sensitive, limit_per_file,
+                multiline, large_files, large_file_threshold, large_pattern)
+        if self.stats is None:
+            return self._match_file(*args)
+        started = time.perf_counter()
+        result = self._match_file(*args)
+        self.stats.file_done(filepath, time.perf_counter() - started)
+        return result
+
+    def _match_file(self, filepath, query, threshold, pattern, search_office, case_sensitive, limit_per_file,
+                    multiline, large_files, large_file_threshold, large_pattern):
+        """Body of _search_file, without the per-file timing."""
+        loaded = self._load_file(filepath, query, threshold, pattern, search_office, case_sensitive, limit_per_file,
+                                 multiline, large_files, large_file_threshold, large_pattern)
+        return self._match_loaded(filepath, loaded, query, threshold, pattern, case_sensitive, limit_per_file, multiline)
+
+    @staticmethod
+    def _result(filepath, matches, **extra):
+        """The result dict of a file. matches are ranked, so the first one carries the file's score."""
+        result = {
+            'path': filepath,
+            'filename': os.path.basename(filepath),
+            'score': matches[0][1] if matches else 0,
+            'matches': matches
+        }
+        result.update(extra)
+        return result
+
+    @staticmethod
+    def _error_result(filepath, message):
+        """A result without matches that reports a file which could not be searched, e.g. an extraction timeout."""
+        return SearchEngine._result(filepath, [], error=message)
+
+    @staticmethod
+    def _fuzzy_extract(query, lines, threshold, case_sensitive, limit=None, first_line=0):
+        """Scores lines with partial_ratio; returns process.extract's (line, score, first_line + index) tuples."""
+        processor = None if case_sensitive else str.lower
+        found = process.extract(query, lines, scorer=fuzz.partial_ratio, limit=limit,
+                                score_cutoff=threshold, processor=processor)
+        return [(line, score, first_line + index) for line, score, index in found]
+
+    @staticmethod
+    def _rank(matches, limit=None):
+        """Orders fuzzy matches as process.extract does, best score first and then line order, and keeps the first limit."""
+        matches.sort(key=lambda m: (-m[1], m[2]))
+        if limit:
+            del matches[limit:]
+        return matches
+
+    def _load_file(self, filepath, query, threshold, pattern, search_office, case_sensitive, limit_per_file,
+                   multiline=False, large_files=False, large_file_threshold=DEFAULT_LARGE_FILE_THRESHOLD, large_pattern=None):
+        """
+        The I/O half of _match_file. Returns ('text', content) for _match_loaded, or
+        ('done', result or None) for files that are skipped, or for documents and memory-mapped
+        or streamed files, since those interleave reading and matching.
+        """
+        stats = self.stats
+
+        if search_office and self._document_blocks(filepath) is not None:
+            # Documents are matched while they are extracted
+            try:
+                return 'done', self._search_document(filepath, query, threshold, pattern, case_sensitive, limit_per_file, multiline)
+            except ExtractionError as e:
+                return 'done', self._error_result(filepath, str(e))
+
+        try:
+            st = os.stat(filepath)
+        except OSError:
+            if stats is not None:
+                stats.skip('unreadable')
+            return 'done', None
+        if st.st_size > large_file_threshold:
+            if not large_files or not self.is_large_text_file(filepath, large_file_threshold, st):
+                if stats is not None:
+                    stats.skip('too_large' if not large_files else 'binary')
+                return 'done', None
+            if pattern is not None and large_pattern is None:
+                if stats is not None:
+                    stats.skip('no_bytes_pattern')
+                return 'done', None # Pattern cannot be matched against bytes
+            if stats is None:
+                return 'done', self._search_large_file(filepath, query, threshold, large_pattern, case_sensitive, limit_per_file, multiline)
+            # Reading and matching are interleaved through the memory map
+            started = time.perf_counter()
+            result = self._search_large_file(filepath, query, threshold, large_pattern, case_sensitive, limit_per_file, multiline)
+            stats.add_time('match', time.perf_counter() - started)
+            stats.add_bytes(st.st_size)
+            return 'done', result
+
+        if st.st_size > self.stream_chunk_size and not (pattern is not None and multiline):
+            matches = self._stream_matches(filepath, st, query, threshold, pattern, case_sensitive,
+                                           limit_per_file, large_file_threshold)
+            return 'done', self._result(filepath, matches) if matches else None
 
-    def search(self, directory, query, stop_event=None, threshold=60, update_callback=None, use_regex=False, search_office=False, case_sensitive=False, limit_per_file=0):
+        # Single read: classify, decode and hand the text to the matcher
+        content = self.read_text(filepath, large_file_threshold, st)
+        if content is None:
+            return 'done', None
+        return 'text', content
+
+    def _match_loaded(self, filepath, loaded, query, threshold, pattern, case_sensitive, limit_per_file, multiline=False):
+        """The matching half of _match_file, run on what _load_file returned."""
+        kind, content = loaded
+        if kind == 'done':
+            return content
+        stats = self.stats
+
+        try:
+            if stats is not None:
+                started = time.perf_counter()
+            matches = []
+            if pattern is not None:
+                if not content:
+                    return None
+                matches = self._regex_matches(content, pattern, limit_per_file, multiline)
+            else:
+                # Same line splitting as readlines()
+                lines = io.StringIO(content).readlines()
+
+                if not lines:
+                    return None
+
+                # Set limit based on limit_per_file. If 0, use None (rapidfuzz default is 10)
+                fuzzy_limit = limit_per_file if limit_per_file > 0 else None
+
+                matches = self._fuzzy_extract(query, lines, threshold, case_sensitive, fuzzy_limit)
+            if stats is not None:
+                stats.add_time('match', time.perf_counter() - started)
+
+            if matches:
+                return self._result(filepath, matches)
+
+        except Exception as e:
+            print(f"Error reading {filepath}: {e}")
+        return None
+
+    def _stream_matches(self, filepath, st, query, threshold, pattern, case_sensitive, limit_per_file, large_file_threshold):
+        """
+        Matches a text file block by block from iter_text_blocks, numbering lines across blocks.
+        In regex mode reading stops as soon as limit_per_file matches are found; in fuzzy mode
+        only the best limit_per_file matches so far are kept between blocks.
+        Returns matches in the same order as the whole-file matchers.
+        """
+        stats = self.stats
+        fuzzy_limit = limit_per_file if limit_per_file > 0 else None
+        matches = []
+        line_no = 0
+        blocks = self.iter_text_blocks(filepath, large_file_threshold, st, self.stream_chunk_size)
+        try:
+            for block in blocks:
+                if stats is not None:
+                    started = time.perf_counter()
+                if pattern is not None:
+                    remaining = limit_per_file - len(matches) if limit_per_file > 0 else 0
+                    for line, score, index, span in self._regex_matches(block, pattern, remaining):
+                        matches.append((line, score, index + line_no, span))
+                    line_no += block.count('\n')
+                else:
+                    lines = io.StringIO(block).readlines()
+                    matches.extend(self._fuzzy_extract(query, lines, threshold, case_sensitive, fuzzy_limit, line_no))
+                    line_no += len(lines)
+                    if fuzzy_limit:
+                        self._rank(matches, fuzzy_limit)
+                if stats is not None:
+                    stats.add_time('match', time.perf_counter() - started)
+                if pattern is not None and limit_per_file > 0 and len(matches) >= limit_per_file:
+                    break
+        except Exception as e:
+            print(f"Error reading {filepath}: {e}")
+            return None
+        finally:
+            blocks.close()
+
+        if pattern is None:
+            self._rank(matches)
+        return matches
+
+    def _search_document(self, filepath, query, threshold, pattern, case_sensitive, limit_per_file, multiline):
+        """
+        Matches a .docx/.xlsx/.pdf document block by block as iter_blocks delivers it, numbering
+        lines across blocks. Extraction stops once later blocks cannot change the result: after
+        limit_per_file regex matches, or limit_per_file fuzzy matches scoring 100. Multiline
+        patterns need the whole text. PDF results carry 'page_starts', the index of each page's
+        first line; Word and Excel results carry 'locations', the (section, ref) of each matched line.
+        """
+        stats = self.stats
+        fuzzy_limit = limit_per_file if limit_per_file > 0 else None
+        matches = []
+        lines = []
+        page_starts = []
+        # line index -> (section, ref) of matched lines
+        refs = {}
+        # First line index and (section, ref) of every line, for multiline patterns
+        all_starts = []
+        all_refs = []
+        line_no = 0
+        blocks = self.iter_blocks(filepath, self.stop_event)
+        try:
+            for section, block_lines, block_refs in blocks:
+                page_starts.append(line_no)
+                if stats is not None:
+                    started = time.perf_counter()
+                found = []
+                # Line numbers count the line breaks inside paragraphs and cells, as the preview does
+                starts = []
+                next_line_no = line_no
+                for line in block_lines:
+                    starts.append(next_line_no)
+                    next_line_no += line.count('\n') + 1
+                if pattern is not None:
+                    if multiline:
+                        lines.extend(block_lines)
+                        if block_refs is not None:
+                            all_starts.extend(starts)
+                            all_refs.extend((section, ref) for ref in block_refs)
+                    elif block_lines:
+                        remaining = limit_per_file - len(matches) if limit_per_file > 0 else 0
+                        found = [(line, score, index + line_no, span) for line, score, index, span
+                                 in self._regex_matches("\n".join(block_lines), pattern, remaining)]
+                        if block_refs is not None:
+                            for match in found:
+                                k = bisect_right(starts, match[2]) - 1
+                                refs[match[2]] = _line_ref(section, block_refs[k], block_lines[k], match[2] - starts[k])
+                elif block_lines:
+                    scored = self._fuzzy_extract(query, block_lines, threshold, case_sensitive, fuzzy_limit)
+                    found = [(line, score, starts[index]) for line, score, index in scored]
+                    if block_refs is not None:
+                        for _, _, index in scored:
+                            refs[starts[index]] = (section, block_refs[index])
+                line_no = next_line_no
+                matches.extend(found)
+                if pattern is None and fuzzy_limit:
+                    self._rank(matches, fuzzy_limit)
+                    if len(refs) > 2 * fuzzy_limit:
+                        refs = {m[2]: refs[m[2]] for m in matches if m[2] in refs}
+                if stats is not None:
+                    stats.add_time('match', time.perf_counter() - started)
+                if limit_per_file > 0 and len(matches) >= limit_per_file and (pattern is not None or matches[-1][1] == 100):
+                    break
+        finally:
+            blocks.close()
+
+        if pattern is not None and multiline:
+            content = "\n".join(lines)
+            matches = self._regex_matches(content, pattern, limit_per_file, multiline) if content else []
+            if all_refs:
+                for match in matches:
+                    k = bisect_right(all_starts, match[2]) - 1
+                    refs[match[2]] = _line_ref(*all_refs[k], lines[k], match[2] - all_starts[k])
+        elif pattern is None:
+            self._rank(matches)
+        if not matches:
+            return None
+        result = self._result(filepath, matches)
+        if refs:
+            # Labelled by match_location when shown, once fuzzy matches have a span
+            result['locations'] = {m[2]: refs[m[2]] for m in matches if m[2] in refs}
+        elif filepath.lower().endswith('.pdf'):
+            result['page_starts'] = page_starts
+        return result
+
+    def _fuzzy_lines(self, filepath, large_file_threshold, st=None):
+        """Returns the lines of a small text file for fuzzy scoring, or None."""
+        content = self.read_text(filepath, large_file_threshold, st)
+        if content is None:
+            return None
+        # Same line splitting as readlines()
+        return io.StringIO(content).readlines()
+
+    def _load_fuzzy(self, filepath, options):
+        """
+        Loader of the batched fuzzy search: returns (lines, None) for a file to pool into a batch,
+        or (None, result) for a file over the size limit, matched on its own in large-file mode,
+        or for an Office/PDF document, matched block by block by _search_document.
+        """
+        if options['search_office'] and self._document_blocks(filepath) is not None:
+            # Timed by _search_file; extraction failures come back as error results
+            return None, self._search_file(filepath, **options)
+        if self.stats is not None:
+            started = time.perf_counter()
+        try:
+            st = os.stat(filepath)
+        except OSError:
+            st = None # read_text records it as unreadable
+        if st is not None and options['large_files'] and st.st_size > options['large_file_threshold']:
+            # Only files over the threshold go through the memory-mapped matcher, timed by _search_file
+            return None, self._search_file(filepath, **options)
+        lines = self._fuzzy_lines(filepath, options['large_file_threshold'], st)
+        if self.stats is not None:
+            # Scoring is shared by the whole batch, so per-file time covers loading only
+            self.stats.file_done(filepath, time.perf_counter() - started)
+        return lines, None
+
+    def _score_batch(self, query, batch_files, batch_lines, offsets, threshold, limit_per_file):
+        """Scores a batch of lines from many files in one call and yields a result per matching file."""
+        if self.stats is not None:
+            started = time.perf_counter()
+        if np is not None:
+            if (os.cpu_count() or 1) > 2:
+                # One row per line so rapidfuzz can split the rows across all cores
+                scores = process.cdist(batch_lines, [query], scorer=fuzz.partial_ratio, score_cutoff=threshold,
+                                       workers=-1, dtype=np.float64)[:, 0]
+            else:
+                # A single query row reuses one cached scorer, which is cheaper without spare cores
+                scores = process.cdist([query], batch_lines, scorer=fuzz.partial_ratio, score_cutoff=threshold,
+                                       dtype=np.float64)[0]
+            hits = np.flatnonzero(scores >= threshold)
+            hit_files = np.searchsorted(offsets, hits, side='right') - 1
+            scored = zip(hit_files.tolist(), hits.tolist(), scores[hits].tolist())
+        else:
+            found = process.extract(query, batch_lines, scorer=fuzz.partial_ratio, limit=None, score_cutoff=threshold)
+            scored = sorted((bisect_right(offsets, i) - 1, i, score) for _, score, i in found)
+        if self.stats is not None:
+            self.stats.add_time('match', time.perf_counter() - started)
+
+        per_file = {}
+        for file_index, line_index, score in scored:
+            lines = batch_files[file_index][1]
+            local = line_index - offsets[file_index]
+            per_file.setdefault(file_index, []).append((lines[local], score, local))
+
+        for file_index, matches in per_file.items():
+            yield self._result(batch_files[file_index][0], self._rank(matches, limit_per_file))
+
+    def _search_batched(self, loaded, options, stop_event, on_file):
+        """
+        Fuzzy search that pools lines from many files into large batches, pre-lowercased,
+        and scores each batch with a single vectorised rapidfuzz call. Scores are mapped
+        back to (file, line) through an offsets array.
+        loaded yields (path, _load_fuzzy(path, options)) pairs, read inline or by a ReadPipeline.
+        """
+        query = options['query'] if options['case_sensitive'] else options['query'].lower()
+        batch_files = []
+        batch_lines = []
+        offsets = []
+        started = time.monotonic()
+
+        for filepath, (lines, result) in loaded:
+            if stop_event and stop_event.is_set():
+                return
+            on_file()
+
+            if result:
+                yield result
+            if not lines:
+                continue
+
+            if not batch_files:
+                started = time.monotonic()
+            offsets.append(len(batch_lines))
+            batch_files.append((filepath, lines))
+            batch_lines.extend(lines if options['case_sensitive'] else [line.lower() for line in lines])
+
+            if len(batch_lines) >= self.fuzzy_batch_lines or time.monotonic() - started >= self.fuzzy_batch_interval:
+                yield from self._score_batch(query, batch_files, batch_lines, offsets,
+                                             options['threshold'], options['limit_per_file'])
+                batch_files, batch_lines, offsets = [], [], []
+
+        if batch_files:
+            yield from self._score_batch(query, batch_files, batch_lines, offsets,
+                                         options['threshold'], options['limit_per_file'])
+
+    def _search_pipelined(self, loaded, options, stop_event, on_file):
+        """
+        Sequential search over (path, (_load_file result, load seconds)) pairs from a ReadPipeline,
+        so files are matched here while reader threads load the next ones.
+        """
+        for filepath, (file_loaded, seconds) in loaded:
+            if stop_event and stop_event.is_set():
+                break
+            on_file()
+            if self.stats is not None:
+                started = time.perf_counter()
+            # options is read per file, so a threshold raised for top_k applies to the next match
+            result = self._match_loaded(filepath, file_loaded, options['query'], options['threshold'], options['pattern'],
+                                        options['case_sensitive'], options['limit_per_file'], options['multiline'])
+            if self.stats is not None:
+                self.stats.file_done(filepath, seconds + time.perf_counter() - started)
+            if result:
+                yield result
+
+    def _timed_load(self, filepath, options):
+        """Reader-thread half of _search_pipelined: returns (_load_file result, seconds taken)."""
+        started = time.perf_counter()
+        return self._load_file(filepath, **options), time.perf_counter() - started
+
+    def _search_parallel(self, paths, options, stop_event, workers, on_done):
+        """
+        Fans paths out to a process pool in chunks and yields results in completion order.
+        on_done(n) is called with the number of files in each finished chunk.
+        """
+        # Spawned rather than forked: the GUI runs searches from a QThread, and forking a threaded process can deadlock
+        context = multiprocessing.get_context('spawn')
+        # Set when the search stops, so chunks already running abandon their current document
+        cancel = context.Event()
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                       initializer=_init_worker, initargs=(self.cache_dir, cancel))
+        pending = {}
+        paths = iter(paths)
+        try:
+            exhausted = False
+            while True:
+                # Keep a bounded number of chunks in flight so the walk never runs far ahead
+                while not exhausted and len(pending) < workers * 4:
+                    chunk = list(islice(paths, self.parallel_chunk_size))
+                    if not chunk:
+                        exhausted = True
+                        break
+                    pending[executor.submit(_search_chunk, chunk, options, self.stats is not None)] = len(chunk)
+
+                if not pending or (stop_event and stop_event.is_set()):
+                    break
+
+                done, _ = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                for future in done:
+                    on_done(pending.pop(future))
+                    results, stats = future.result()
+                    if stats is not None and self.stats is not None:
+                        self.stats.merge(stats)
+                    for result in results:
+                        yield result
+        finally:
+            cancel.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _isolated(self):
+        """True if extraction should go through the ExtractionPool rather than run in-process."""
+        # Daemonic processes (e.g. multiprocessing.Pool workers) may not start children
+        return self.isolate_extraction and not multiprocessing.current_process().daemon
+
+    def _pool(self):
+        with self._extraction_pool_lock:
+            if self.extraction_pool is None:
+                self.extraction_pool = ExtractionPool(_extract_document, self.extraction_workers,
+                                                      self.extraction_timeout, self.extraction_memory_mb)
+            return self.extraction_pool
+
+    def iter_blocks(self, filepath, stop_event=None, preview=False):
+        """
+        Yields the (section, lines, refs) blocks of a .docx/.xlsx/.pdf document in order, as soon as
+        each is extracted, so a search can stop reading early; a PDF gives one block per page.
+        Extraction streams from the isolated ExtractionPool (PDFs over parallel_pdf_bytes are split
+        across its processes), or runs in-process when isolate_extraction is off. Documents are
+        cached once fully read if their text fits in cache_text_limit. Raises ExtractionError if
+        the extraction timed out, hit the memory cap or crashed; setting stop_event ends the blocks.
+        A preview extraction does not wait for the processes a search is using.
+        """
+        blocks_of = self._document_blocks(filepath)
+        if blocks_of is None:
+            return
+        try:
+            st = os.stat(filepath)
+        except OSError:
+            return
+
+        stats = self.stats
+        if stats is not None:
+            started = time.perf_counter()
+        cached = self.extraction_cache.get_layout(filepath, st)
+        if stats is not None:
+            stats.add_time('extract', time.perf_counter() - started)
+        if cached is not None:
+            lines, layout = cached
+            ends = [start for start, _, _ in layout[1:]] + [len(lines)]
+            for (start, section, refs), end in zip(layout, ends):
+                yield section, lines[start:end], refs
+            return
+
+        if self._isolated():
+            parts = self.extraction_workers if blocks_of is SearchEngine._iter_pdf_pages and st.st_size > self.parallel_pdf_bytes else 1
+            blocks = self._pool().stream(filepath, stop_event, self.extraction_timeout, parts, preview)
+        else:
+            blocks = blocks_of(filepath)
+        # Text kept for the cache; dropped once it outgrows cache_text_limit so memory stays flat
+        lines = []
+        layout = []
+        chars = 0
+        try:
+            while not (stop_event is not None and stop_event.is_set()):
+                if stats is not None:
+                    started = time.perf_counter()
+                try:
+                    block = next(blocks, None)
+                except MemoryError:
+                    raise ExtractionError("Extraction ran out of memory")
+                if stats is not None:
+                    stats.add_time('extract', time.perf_counter() - started)
+                if block is None:
+                    break
+                index, (section, block_lines, refs) = block
+                # Blocks a failed worker did not deliver are kept as empty blocks (PDF pages)
+                while len(layout) < index:
+                    layout.append((len(lines) if lines is not None else 0, None, None))
+                    yield None, [], None
+                layout.append((len(lines) if lines is not None else 0, section, refs))
+                if lines is not None:
+                    chars += sum(map(len, block_lines))
+                    if chars > self.cache_text_limit:
+                        lines = None
+                    else:
+                        lines.extend(block_lines)
+                yield section, block_lines, refs
+        finally:
+            blocks.close()
+            # Counted even when the caller stopped reading early
+            if stats is not None:
+                stats.add_bytes(st.st_size)
+        # Cancelled passes and empty results are not cached so they are retried next time
+        if lines and not (stop_event is not None and stop_event.is_set()):
+            self.extraction_cache.put(filepath, st, lines, layout)
+
+    def extract_text(self, filepath, stop_event=None, preview=False):
+        """
+        Returns the text lines of a .docx/.xlsx/.pdf document, or None for other files.
+        Extracted text is reused from the extraction cache until the file changes.
+        Raises ExtractionError if the extraction timed out, hit the memory cap or crashed;
+        setting stop_event abandons it (with the lines read so far) straight away.
+        With preview (for the UI thread), the extraction runs even while a search holds every extraction process.
+        """
+        if self._document_blocks(filepath) is None:
+            return None
+        lines = []
+        for _, block_lines, _ in self.iter_blocks(filepath, stop_event, preview):
+            lines.extend(block_lines)
+        return lines
+
+    def _search_options(self, query, threshold, use_regex, search_office, case_sensitive, limit_per_file,
+                        multiline, large_files, large_file_threshold):
+        """Builds the per-file _search_file keyword arguments, or returns None for an invalid regex."""
+        pattern = None
+        large_pattern = None
+        if use_regex:
+            try:
+                pattern = self.compile_query(query, case_sensitive)
+            except re.error:
+                return None
+            if large_files:
+                try:
+                    large_pattern = self.compile_query(query, case_sensitive, as_bytes=True)
+                except re.error:
+                    pass # Large files are skipped if the pattern has no bytes form
+
+        return {
+            'query': query,
+            'threshold': threshold,
+            'pattern': pattern,
+            'search_office': search_office,
+            'case_sensitive': case_sensitive,
+            'limit_per_file': limit_per_file,
+            'multiline': multiline,
+            'large_files': large_files,
+            'large_file_threshold': large_file_threshold,
+            'large_pattern': large_pattern,
+        }
+
+    def search_paths(self, paths, query, stop_event=None, threshold=60, use_regex=False, search_office=False, case_sensitive=False, limit_per_file=0, multiline=False, large_files=False, large_file_threshold=DEFAULT_LARGE_FILE_THRESHOLD):
+        """
+        Searches just the given files with the same options as search(), e.g. after they changed.
+        Yields (path, result) for every path, with result None if the file no longer matches.
+        """
+        options = self._search_options(query, threshold, use_regex, search_office, case_sensitive, limit_per_file,
+                                       multiline, large_files, large_file_threshold)
+        if options is None:
+            return
+        self.stop_event = stop_event
+        for filepath in paths:
+            if stop_event and stop_event.is_set():
+                break
+            yield filepath, self._search_file(filepath, **options)
+
+    def _pinned_path(self, directory, folder):
+        """Returns folder (absolute or relative to directory) as the walk spells it, or None unless it is a subfolder."""
+        if not folder:
+            return None
+        rel = os.path.relpath(os.path.abspath(os.path.join(directory, folder)), os.path.abspath(directory))
+        if rel == os.curdir or rel.split(os.sep)[0] == os.pardir:
+            return None
+        pinned = os.path.join(directory, rel)
+        return pinned if os.path.isdir(pinned) else None
+
+    def search(self, directory, query, stop_event=None, threshold=60, update_callback=None, use_regex=False, search_office=False, case_sensitive=False, limit_per_file=0, use_index=False, workers=1, expected_total=0, multiline=False, large_files=False, large_file_threshold=DEFAULT_LARGE_FILE_THRESHOLD, fuzzy_batch=True, use_cache=False, collect_stats=False, top_k=0, max_results=0, include_globs=None, exclude_globs=None, use_ignore_files=False, scan_order='walk', pinned_folder=None, io_threads=0):
         """
         Walks the directory and searches for the query in text files.
         Yields results as they are found.
+        With use_index, a persistent trigram index narrows the files that get opened by literal
+        and regex queries; queries it cannot narrow, such as fuzzy ones, use the plain walk.
+        With workers > 1, files are searched in a pool of that many processes.
+        In regex mode the query is compiled once and run over whole file buffers;
+        multiline lets matches span several lines.
+        With large_files, files over large_file_threshold are scanned through a memory map
+        instead of being skipped.
+        With fuzzy_batch, single-process fuzzy searches score lines from many files per call.
+        With use_cache, results of an earlier identical search are reused for files whose
+        size and mtime are unchanged, and only the changed files are rescanned.
+        With collect_stats, per-phase times and counters are gathered in self.stats and
+        reported as ("Stats", count, summary dict) through update_callback before "Finished".
+        With top_k, only the top_k best-scoring files are yielded, best first, once the search
+        ends; the fuzzy cutoff rises to the weakest kept score as the heap fills, and the walk
+        stops early once every kept file scores 100.
+        max_results stops the walk once that many files have matched.
+        include_globs and exclude_globs (gitignore-style, relative to directory) and, with
+        use_ignore_files, nested .gitignore/.ignore files limit the files searched; ignored
+        folders are pruned from the walk.
+        scan_order ('walk', 'recent' or 'smallest') chooses which files are searched first, and
+        files under pinned_folder (a subfolder of directory) go ahead of all others; a walk is
+        reordered through a bounded priority queue fed by a background thread.
+        With io_threads > 0 (and a single worker), that many reader threads load files ahead of
+        the matcher through a ReadPipeline; ("Queues", count, {stage: depth}) reports its backlog.
+        expected_total seeds the progress estimate (e.g. the file count of the previous run);
+        the final count is reported as ("Finished", count, count) through update_callback.
         """
         if not query or not directory:
             return
 
-        # 1. Pre-scan to count total files for progress bar
-        total_files = 0
-        if update_callback:
-            update_callback(("Scanned", 0, 0)) # Signal start
-            for root, dirs, files in os.walk(directory):
-                if stop_event and stop_event.is_set():
-                    return
-                dirs[:] = [d for d in dirs if d not in self.common_excludes]
-                total_files += len(files)
-            update_callback(("Total", 0, total_files))
+        options = self._search_options(query, threshold, use_regex, search_office, case_sensitive, limit_per_file,
+                                       multiline, large_files, large_file_threshold)
+        if options is None:
+            return # Invalid regex
+        pattern = options['pattern']
+        if use_index and not required_grams(query, use_regex, threshold)[0]:
+            # Queries without required trigrams (all fuzzy ones) would read every file to refresh the index for nothing
+            use_index = False
+        # All instrumentation is guarded by `self.stats is not None`, so it costs nothing when off
+        self.stats = SearchStats() if collect_stats else None
+        self.stop_event = stop_event
+        path_filter = None
+        if include_globs or exclude_globs or use_ignore_files:
+            path_filter = PathFilter(directory, include_globs or (), exclude_globs or (), use_ignore_files)
+
+        pinned = self._pinned_path(directory, pinned_folder)
 
         file_count = 0
-        for root, dirs, files in os.walk(directory):
-            # Check for cancellation
+        cached = None
+        reused = []
+        scanner = None
+        if use_cache:
+            # 1. Snapshot the tree; the stats double as the trigram index refresh input
+            entries = list(self._walk_stats(directory, stop_event, path_filter))
             if stop_event and stop_event.is_set():
+                return
+            snapshot = {path: (st.st_size, st.st_mtime_ns) for path, st in entries}
+            cache_key = (os.path.abspath(directory), query, threshold, use_regex, search_office, case_sensitive,
+                         limit_per_file, multiline, large_files, large_file_threshold,
+                         tuple(include_globs or ()), tuple(exclude_globs or ()), use_ignore_files)
+            cached = self.result_cache.get(cache_key)
+            found = {}
+
+        if use_cache and cached is not None:
+            # 2. Reuse results of unchanged files, then rescan only what changed
+            old_snapshot = cached['snapshot']
+            changed = [path for path, signature in snapshot.items() if old_snapshot.get(path) != signature]
+            changed_set = set(changed)
+            for path, result in cached['results'].items():
+                if path in snapshot and path not in changed_set:
+                    reused.append(result)
+            file_count = len(snapshot) - len(changed)
+            paths = changed
+            if use_index and changed:
+                indexed = self._indexed_paths(directory, query, stop_event, threshold, update_callback, use_regex, search_office, large_files,
+                                              entries if path_filter is None else None, path_filter, large_file_threshold)
+                if indexed is None:
+                    return
+                paths = [path for path in indexed if path in changed_set]
+            total_files = file_count + len(paths)
+            estimate = lambda: total_files
+        elif use_index:
+            paths = self._indexed_paths(directory, query, stop_event, threshold, update_callback, use_regex, search_office, large_files,
+                                        entries if use_cache and path_filter is None else None, path_filter, large_file_threshold)
+            if paths is None:
+                return
+            total_files = len(paths)
+            estimate = lambda: total_files
+        elif use_cache:
+            paths = list(snapshot)
+            total_files = len(paths)
+            estimate = lambda: total_files
+        else:
+            # Matching starts straight away; the total is estimated as the walk goes
+            scanner = DirectoryScanner(directory, self.common_excludes, stop_event, expected_total, self.stats, path_filter, pinned)
+            if scan_order != 'walk':
+                paths = iter(ScanScheduler(scanner, scan_order, pinned))
+            else:
+                paths = (entry.path for entry in scanner)
+            estimate = scanner.estimate
+
+        if scanner is None:
+            # The file list is already known, so it is sorted outright
+            paths = order_paths(paths, scan_order, pinned, snapshot if use_cache else None)
+
+        if update_callback:
+            update_callback(("Total", file_count, estimate()))
+
+        pipeline = None
+
+        def on_file():
+            nonlocal file_count
+            file_count += 1
+            if update_callback and file_count % 5 == 0:
+                update_callback(("Progress", file_count, estimate()))
+                if pipeline is not None:
+                    update_callback(("Queues", file_count, pipeline.depths()))
+
+        if workers > 1:
+            def on_done(n):
+                nonlocal file_count
+                file_count += n
+                if update_callback:
+                    update_callback(("Progress", file_count, estimate()))
+
+            results = self._search_parallel(paths, options, stop_event, workers, on_done)
+        elif pattern is None and fuzzy_batch:
+            if io_threads > 0:
+                pipeline = ReadPipeline(paths, lambda filepath: self._load_fuzzy(filepath, options), io_threads, stop_event)
+                loaded = iter(pipeline)
+            else:
+                loaded = ((filepath, self._load_fuzzy(filepath, options)) for filepath in paths)
+            results = self._search_batched(loaded, options, stop_event, on_file)
+        elif io_threads > 0:
+            # The lambda reads options on each call, so a threshold raised for top_k reaches the readers
+            pipeline = ReadPipeline(paths, lambda filepath: self._timed_load(filepath, options), io_threads, stop_event)
+            results = self._search_pipelined(pipeline, options, stop_event, on_file)
+        else:
+            def sequential():
+                nonlocal file_count
+                for filepath in paths:
+                    if stop_event and stop_event.is_set():
+                        break
+
+                    file_count += 1
+                    if update_callback and file_count % 5 == 0:
+                        update_callback(("Progress", file_count, estimate()))
+
+                    result = self._search_file(filepath, **options)
+                    if result:
+                        yield result
+
+            results = sequential()
+
+        # min-heap of (score, -order, result): the weakest, then latest, kept result sits on top
+        top = []
+        matched = 0
+        limited = False
+        # Files whose extraction failed; left out of the cached snapshot so a rerun retries them
+        errored = set()
+        for order, result in enumerate(chain(reused, results)):
+            if 'error' in result:
+                errored.add(result['path'])
+                yield result # Reported as is: never ranked, counted towards max_results or cached
+                continue
+            if use_cache:
+                found[result['path']] = result
+            matched += 1
+            if not top_k:
+                yield result
+            elif len(top) < top_k or result['score'] > top[0][0]:
+                if pattern is None and options['threshold'] > threshold:
+                    # Scored against a raised cutoff; rescore so the kept file lists every line above threshold
+                    result = self._search_file(result['path'], **dict(options, threshold=threshold)) or result
+                if len(top) < top_k:
+                    heapq.heappush(top, (result['score'], -order, result))
+                else:
+                    heapq.heapreplace(top, (result['score'], -order, result))
+                if len(top) == top_k:
+                    if top[0][0] >= 100:
+                        limited = True # No later file can beat a full heap of perfect scores
+                        break
+                    # Later files only matter if they beat the weakest kept result
+                    options['threshold'] = max(threshold, top[0][0])
+            if max_results and matched >= max_results:
+                limited = True
                 break
 
-            # Modify dirs in-place to skip excluded directories
-            dirs[:] = [d for d in dirs if d not in self.common_excludes]
-            
-            for file in files:
-                if stop_event and stop_event.is_set():
-                    break
+        if limited:
+            results.close() # Shuts down the pool or walk that was cut short
+        if pipeline is not None:
+            pipeline.close()
+        if top_k:
+            for _, _, result in sorted(top, reverse=True):
+                yield result
 
-                file_count += 1
-                if update_callback and (file_count % 5 == 0 or file_count == total_files):
-                    update_callback(("Progress", file_count, total_files))
+        if self.stats is not None:
+            self.last_stats = self.stats.summary()
+            self.stats = None
+            if update_callback:
+                update_callback(("Stats", file_count, self.last_stats))
+        if limited or (stop_event and stop_event.is_set()):
+            return
+        if use_cache and not top_k:
+            if errored:
+                snapshot = {path: signature for path, signature in snapshot.items() if path not in errored}
+            self.result_cache.put(cache_key, snapshot, found)
+        if update_callback:
+            update_callback(("Finished", file_count, file_count))
 
-                filepath = os.path.join(root, file)
-                
-                is_office = False
-                lines = []
 
-                if search_office:
-                    lower_file = file.lower()
-                    if lower_file.endswith('.docx'):
-                        lines = self._extract_text_from_docx(filepath)
-                        is_office = True
-                    elif lower_file.endswith('.xlsx'):
-                        lines = self._extract_text_from_xlsx(filepath)
-                        is_office = True
-                    elif lower_file.endswith('.pdf'):
-                        lines = self._extract_text_from_pdf(filepath)
-                        is_office = True
-
-                if not is_office:
-                    if not self.is_text_file(filepath):
-                        continue
+# Start of a group that sets flags for its contents, e.g. (?s: or (?i-s:
+_SCOPED_FLAGS = re.compile(r'\(\?([aiLmsux]*)(?:-([imsx]+))?:')
 
-                try:
-                    if not is_office:
-                        with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-                            lines = f.readlines()
-                    
-                    if not lines:
-                        continue
 
-                    matches = []
-                    if use_regex:
-                        try:
-                            flags = 0 if case_sensitive else re.IGNORECASE
-                            pattern = re.compile(query, flags)
-                            for i, line in enumerate(lines):
-                                for match in pattern.finditer(line):
-                                    matches.append((line.strip(), 100, i, match.span()))
-                                    if limit_per_file > 0 and len(matches) >= limit_per_file:
-                                        break
-                                if limit_per_file > 0 and len(matches) >= limit_per_file:
-                                    break
-                        except re.error:
-                            pass # Invalid regex
-                    else:
-                        processor = None if case_sensitive else lambda x: x.lower()
-                        
-                        # Set limit based on limit_per_file. If 0, use None (rapidfuzz default is 10)
-                        fuzzy_limit = limit_per_file if limit_per_file > 0 else None
-                        
-                        matches = process.extract(
-                            query, 
-                            lines, 
-                            scorer=fuzz.partial_ratio, 
-                            limit=fuzzy_limit,
-                            score_cutoff=threshold,
-                            processor=processor
-                        )
-                    
-                    if matches:
-                        best_score = matches[0][1]
-                        yield {
-                            'path': filepath,
-                            'filename': file,
-                            'score': best_score,
-                            'matches': matches
-                        }
-
-                except Exception as e:
-                    print(f"Error reading {filepath}: {e}")
-                    continue
+def _raw_line_pattern(query, dotall=False):
+    """
+    Rewrites a regex for raw file bytes, where lines may also end in \\r\\n or a lone \\r:
+    ^, $ and . treat \\r as a line end, and \\n matches any of the three line ends,
+    so matches agree with a search of the newline-translated text. Where DOTALL is on
+    (dotall, or a scoped (?s:...) group), . matches any line end as a single character.
+    """
+    out = []
+    in_class = False
+    # DOTALL state of the enclosing groups
+    groups = []
+    i = 0
+    while i < len(query):
+        c = query[i]
+        if c == '\\' and i + 1 < len(query):
+            c = query[i:i + 2]
+            i += 1
+        if c in ('\\n', '\n'):
+            out.append('\\n\\r' if in_class else '(?:\\r\\n?|\\n)')
+        elif in_class:
+            out.append(c)
+            in_class = c != ']'
+        elif c == '[':
+            # A ] right after [ or [^ is a literal member of the class
+            end = i + 1 + (query[i + 1:i + 2] == '^')
+            end += query[end:end + 1] == ']'
+            out.append(query[i:end])
+            i = end - 1
+            in_class = True
+        elif c == '(' and query.startswith('(?#', i):
+            end = query.find(')', i)
+            end = len(query) if end == -1 else end + 1
+            out.append(query[i:end])
+            i = end - 1
+        elif c == '(':
+            groups.append(dotall)
+            scoped = _SCOPED_FLAGS.match(query, i)
+            if scoped:
+                dotall = (dotall or 's' in scoped.group(1)) and 's' not in (scoped.group(2) or '')
+            out.append(c)
+        elif c == ')':
+            if groups:
+                dotall = groups.pop()
+            out.append(c)
+        elif c == '.':
+            out.append('(?:\\r\\n|(?!\\r\\n).)' if dotall else '(?:(?!\\r).)')
+        elif c == '^':
+            out.append('(?:^|(?<=\\r)(?!\\n))')
+        elif c == '$':
+            out.append('(?=\\r|(?<!\\r)$|\\Z)')
+        else:
+            out.append(c)
+        i += 1
+    return ''.join(out)
+
+
+def page_number(result, line_index):
+    """1-based page of a line of a PDF result, or None for results without page starts."""
+    page_starts = result.get('page_starts')
+    if not page_starts:
+        return None
+    return bisect_right(page_starts, line_index)
+
+
+def match_location(result, match):
+    """
+    Where a match sits in its document: 'page 3', 'paragraph 12' or an Excel cell such as 'Sheet1!B7',
+    the cell holding the start of the match's span (the row's first cell for a match without one).
+    Returns None for matches in other files.
+    """
+    page = page_number(result, match[2])
+    if page is not None:
+        return f"page {page}"
+    location = result.get('locations', {}).get(match[2])
+    if location is None:
+        return None
+    section, ref = location
+    if section is None:
+        return f"paragraph {ref}"
+    start = match[3][0] if len(match) > 3 and isinstance(match[3], tuple) else 0
+    column = ref[2]
+    for i in range(1, len(ref), 2):
+        if ref[i] > start:
+            break
+        column = ref[i + 1]
+    if not re.fullmatch(r'\w+', section):
+        section = "'" + section.replace("'", "''") + "'"
+    return f"{section}!{_column_letter(column)}{ref[0]}"
+
+
+def _line_ref(section, ref, text, lines_down):
+    """(section, ref) of the lines_down-th line of a row or paragraph that contains line breaks."""
+    if section is None or lines_down == 0:
+        return section, ref
+    base = -1
+    for _ in range(lines_down):
+        base = text.index('\n', base + 1)
+    # Cell offsets become relative to that line, as regex spans are
+    return section, (ref[0],) + tuple(v - base - 1 if i % 2 == 0 else v for i, v in enumerate(ref[1:]))
+
+
+def _column_letter(column):
+    letters = ''
+    while column:
+        column, remainder = divmod(column - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+def _extract_document(filepath, part=0, parts=1):
+    """
+    Runs the matching document extractor inside an ExtractionPool process: returns the
+    block generator of one share of the document for ExtractionPool.stream.
+    """
+    blocks_of = SearchEngine._document_blocks(filepath)
+    if blocks_of is SearchEngine._iter_pdf_pages:
+        return blocks_of(filepath, part, parts)
+    return blocks_of(filepath) # Word and Excel files are read by a single process
+
+
+# WordprocessingML namespace of .docx body elements
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+# Text of the run elements python-docx translates (w:br is handled by _paragraph_text)
+_RUN_TEXT = {_W + 'tab': '\t', _W + 'ptab': '\t', _W + 'cr': '\n', _W + 'noBreakHyphen': '-'}
+
+
+def _docx_main_part(archive):
+    """Name of the main document part of a .docx archive, from its package relationships."""
+    try:
+        with archive.open('_rels/.rels') as f:
+            for rel in ElementTree.parse(f).getroot():
+                if rel.get('Type', '').endswith('/officeDocument'):
+                    return rel.get('Target').lstrip('/')
+    except KeyError:
+        pass
+    return 'word/document.xml'
+
+
+def _paragraph_text(paragraph):
+    """Text of a w:p element, built the same way as python-docx's Paragraph.text."""
+    parts = []
+    for child in paragraph:
+        if child.tag == _W + 'r':
+            runs = (child,)
+        elif child.tag == _W + 'hyperlink':
+            runs = child.findall(_W + 'r')
+        else:
+            continue
+        for run in runs:
+            for element in run:
+                if element.tag == _W + 't':
+                    parts.append(element.text or '')
+                elif element.tag == _W + 'br':
+                    # Page and column breaks have no text
+                    if element.get(_W + 'type', 'textWrapping') == 'textWrapping':
+                        parts.append('\n')
+                else:
+                    parts.append(_RUN_TEXT.get(element.tag, ''))
+    return ''.join(parts)
+
+
+# Per-process engine used by the parallel search pool
+_worker_engine = None
+
+
+def _init_worker(cache_dir, cancel_event):
+    global _worker_engine
+    _worker_engine = SearchEngine(cache_dir)
+    # The pool already extracts one document per worker, so each needs a single extraction process
+    _worker_engine.extraction_workers = 1
+    _worker_engine.stop_event = cancel_event
+
+
+def _search_chunk(paths, options, collect_stats=False):
+    """Searches a chunk of files inside a pool process and returns (results, stats summary or None)."""
+    _worker_engine.stats = SearchStats() if collect_stats else None
+    results = []
+    for filepath in paths:
+        if _worker_engine.stop_event.is_set():
+            break
+        result = _worker_engine._search_file(filepath, **options)
+        if result:
+            results.append(result)
+    return results, _worker_engine.stats.summary() if collect_stats else None
@@ -0,0 +1,80 @@
+import heapq
+import threading
+from collections import Counter
+
+
+class SearchStats:
+    """
+    Counters for one search: cumulative seconds per phase (walk, read, decode, extract, match),
+    bytes read, files skipped by reason and the slowest files. SearchEngine only touches it when
+    stats collection is on, so a disabled search pays nothing. Updates are locked, since the
+    reader threads of a ReadPipeline record their files concurrently.
+    """
+
+    phases = ('walk', 'read', 'decode', 'extract', 'match')
+
+    def __init__(self, slowest=10):
+        self.phase_times = dict.fromkeys(self.phases, 0.0)
+        self.bytes_read = 0
+        self.files = 0
+        # reason -> count; 'excluded' counts excluded folders, which are never listed
+        self.skipped = Counter()
+        self.slowest_limit = slowest
+        # Min-heap of (seconds, path), so the fastest of the kept files is dropped first
+        self.slowest = []
+        self.lock = threading.Lock()
+
+    def add_time(self, phase, seconds):
+        with self.lock:
+            self.phase_times[phase] += seconds
+
+    def add_bytes(self, count):
+        with self.lock:
+            self.bytes_read += count
+
+    def skip(self, reason, count=1):
+        with self.lock:
+            self.skipped[reason] += count
+
+    def file_done(self, path, seconds):
+        with self.lock:
+            self.files += 1
+            self._keep_slowest(path, seconds)
+
+    def _keep_slowest(self, path, seconds):
+        if len(self.slowest) < self.slowest_limit:
+            heapq.heappush(self.slowest, (seconds, path))
+        elif seconds > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (seconds, path))
+
+    def merge(self, summary):
+        """Adds a summary() produced elsewhere, e.g. by a pool process."""
+        with self.lock:
+            for phase, seconds in summary['phase_times'].items():
+                self.phase_times[phase] += seconds
+            self.bytes_read += summary['bytes_read']
+            self.files += summary['files']
+            self.skipped.update(summary['skipped'])
+            for path, seconds in summary['slowest']:
+                self._keep_slowest(path, seconds)
+
+    def summary(self):
+        """Returns the counters as a plain, picklable and JSON-friendly dict."""
+        with self.lock:
+            return {
+                'phase_times': {phase: round(seconds, 4) for phase, seconds in self.phase_times.items()},
+                'bytes_read': self.bytes_read,
+                'files': self.files,
+                'skipped': dict(self.skipped),
+                'slowest': [(path, round(seconds, 4)) for seconds, path in sorted(self.slowest, reverse=True)],
+            }
+
+
+def format_summary(summary):
+    """One-line text for a status bar, e.g. 'walk 0.12s, read 0.80s, 12.3 MB read, skipped 4 binary'."""
+    parts = [f"{phase} {seconds:.2f}s" for phase, seconds in summary['phase_times'].items() if seconds >= 0.005]
+    parts.append(f"{summary['bytes_read'] / (1024 * 1024):.1f} MB read")
+    skipped = ", ".join(f"{count} {reason.replace('_', ' ')}" for reason, count in sorted(summary['skipped'].items()))
+    if skipped:
+        parts.append(f"skipped {skipped}")
+    return ", ".join(parts)
@@ -0,0 +1,67 @@
+import os
+import shutil
+import tempfile
+
+from ignore_rules import PathFilter
+
+root = tempfile.mkdtemp()
+
+
+def write(rel, text=""):
+    path = os.path.join(root, *rel.split('/'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+def p(rel):
+    return os.path.join(root, *rel.split('/'))
+
+
+write('.gitignore', "*.log\n!keep.log\n/build\ndocs/*.md\ntmp/\n*.txt\n")
+write('sub/.gitignore', "!notes.txt\n")
+write('sub/.ignore', "notes.txt\n")
+write('other/.gitignore', "!notes.txt\n")
+
+rules = PathFilter(root)
+
+# Unanchored patterns match the name at any depth
+assert rules.skip_file(p('a.log')) and rules.skip_file(p('x/y/a.log'))
+# Anchored patterns only match relative to the ignore file's folder
+assert rules.skip_dir(p('build')) and not rules.skip_dir(p('src/build'))
+assert rules.skip_file(p('docs/a.md')) and not rules.skip_file(p('x/docs/a.md'))
+assert not rules.skip_file(p('docs/sub/a.md')) # '*' stays within one segment
+
+# Directory-only rules skip folders but not files of the same name
+assert rules.skip_dir(p('tmp')) and rules.skip_dir(p('x/tmp'))
+assert not rules.skip_file(p('tmp'))
+
+# The last matching rule wins, so '!' re-includes a file
+assert not rules.skip_file(p('keep.log')) and not rules.skip_file(p('x/keep.log'))
+
+# Deeper ignore files take precedence; within a folder .ignore wins over .gitignore
+assert rules.skip_file(p('a.txt'))
+assert not rules.skip_file(p('other/notes.txt'))
+assert rules.skip_file(p('other/a.txt'))
+assert rules.skip_file(p('sub/notes.txt'))
+
+# allows() checks every parent folder of a path that did not come from the walk
+assert not rules.allows(p('tmp/a.py')) and not rules.allows(p('build/x/a.py'))
+assert rules.allows(p('src/build/a.py'))
+
+# Exclude globs beat ignore-file negations; include globs only narrow files, never folders
+globs = PathFilter(root, include_globs=['*.py', '*.log'], exclude_globs=['keep.log', 'vendor/'])
+assert globs.skip_file(p('keep.log'))
+assert globs.skip_dir(p('x/vendor'))
+assert not globs.skip_dir(p('src')) and not globs.skip_file(p('src/a.py'))
+assert globs.skip_file(p('src/a.c'))
+assert globs.skip_file(p('x/a.log')) # Ignored files stay ignored even when included
+
+# Without ignore files only the globs apply
+plain = PathFilter(root, exclude_globs=['*.c', 'vendor/'], use_ignore_files=False)
+assert not plain.skip_file(p('a.log')) and not plain.skip_dir(p('tmp'))
+assert plain.skip_file(p('src/a.c'))
+assert plain.skip_dir(p('vendor')) and not plain.skip_file(p('vendor'))
+
+shutil.rmtree(root)
+print("OK")
@@ -0,0 +1,39 @@
+import os
+import mmap
+import tempfile
+from search_engine import SearchEngine
+
+engine = SearchEngine()
+
+# Memory-mapped (raw byte) matching must agree with matching the newline-translated
+# text, whatever line ends the file uses.
+texts = [
+    "foo\r\nbar baz\r\n\r\nfoo bar\r\n",  # CRLF
+    "foo\rbar baz\r\rfoo bar\r",          # lone CR
+    "foo\nbar baz\r\nfoo\rbar\n",         # mixed
+]
+patterns = [r'foo$', r'^bar', r'o.*', r'^$', r'foo\nbar', r'\s+', r'[^\n]+',
+            r'(?s)foo.bar', r'(?s:o.b)', r'(?s:o.\s)', r'(?s)(?-s:o.b)|foo.bar']
+
+path = os.path.join(tempfile.mkdtemp(), 'lines.txt')
+for text in texts:
+    translated = text.replace('\r\n', '\n').replace('\r', '\n')
+    with open(path, 'wb') as f:
+        f.write(text.encode('utf-8'))
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for query in patterns:
+            for multiline in (False, True):
+                expected = engine._regex_matches(translated, engine.compile_query(query), multiline=multiline)
+                found = engine._mmap_regex_matches(mm, engine.compile_query(query, as_bytes=True), multiline=multiline)
+                assert found == expected, (text, query, multiline, expected, found)
+
+# DOTALL lets . cross a line end, which counts as one character like the \n it becomes
+with open(path, 'wb') as f:
+    f.write(b"foo\r\nbar\rfoo\nbar")
+with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+    matches = engine._mmap_regex_matches(mm, engine.compile_query(r'(?s)foo.bar', as_bytes=True), multiline=True)
+    print("DOTALL matches:", matches)
+    assert [(m[2], m[3]) for m in matches] == [(0, (0, 7)), (2, (0, 7))]
+    matches = engine._mmap_regex_matches(mm, engine.compile_query(r'foo.bar', as_bytes=True), multiline=True)
+    assert matches == []
+print("OK")
@@ -0,0 +1,16 @@
+from search_engine import SearchEngine
+
+engine = SearchEngine()
+
+# A match that runs past its line is re-matched within the line; the matches
+# found earlier on that line must not be added a second time.
+pattern = engine.compile_query(r'\s+')
+matches = engine._regex_matches("a b\n  c\n", pattern)
+print("Matches:", matches)
+spans = [(m[2], m[3]) for m in matches]
+assert len(spans) == len(set(spans)), "duplicate matches"
+assert [s for s in spans if s[0] == 0] == [(0, (1, 2)), (0, (3, 4))]
+
+limited = engine._regex_matches("a b\n  c\n", pattern, limit_per_file=2)
+assert [(m[2], m[3]) for m in limited] == spans[:2]
+print("OK")
@@ -0,0 +1,25 @@
+from trigram_index import required_grams, text_grams
+
+# A literal regex needs all of its own trigrams, lowercased
+grams, min_shared = required_grams("Hello", use_regex=True)
+print("Literal:", sorted(grams), min_shared)
+assert grams == {b'hel', b'ell', b'llo'} and min_shared == 3
+
+# Only the literal runs of a regex count; runs shorter than a trigram add nothing
+grams, min_shared = required_grams(r"foo\d+bar\s?ba", use_regex=True)
+print("Regex:", sorted(grams), min_shared)
+assert grams == text_grams("foo") | text_grams("bar") and min_shared == 2
+
+# Neither side of an alternation is required
+assert required_grams(r"foobar|quxx", use_regex=True) == (set(), 0)
+
+grams, min_shared = required_grams(r"\d+\s*", use_regex=True)
+assert grams == set() and min_shared == 0
+
+# Invalid patterns do not narrow the search
+assert required_grams("(unclosed", use_regex=True) == (set(), 0)
+
+# Fuzzy queries never narrow the search, so the index is skipped for them
+assert required_grams("hello world") == (set(), 0)
+assert required_grams("hello world", threshold=100) == (set(), 0)
+print("OK")
@@ -0,0 +1,213 @@
+import os
+import sqlite3
+import hashlib
+from array import array
+from collections import defaultdict, Counter
+
+try:
+    from re import _parser as sre_parse
+    from re import _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+GRAM_SIZE = 3
+
+
+def default_cache_dir():
+    """Returns the per-user cache directory used for Grapper's on-disk data."""
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'grapper')
+
+
+def text_grams(text):
+    """Returns the set of lowercased UTF-8 byte trigrams of text."""
+    data = text.lower().encode('utf-8')
+    return {data[i:i + GRAM_SIZE] for i in range(len(data) - GRAM_SIZE + 1)}
+
+
+def _literal_runs(parsed, runs, current):
+    """Collects runs of consecutive literal characters from a parsed regex."""
+    for op, arg in parsed:
+        if op == sre_constants.LITERAL:
+            current.append(chr(arg))
+        elif op == sre_constants.AT:
+            # Anchors do not consume characters, so the run continues
+            continue
+        elif op == sre_constants.SUBPATTERN:
+            _literal_runs(arg[-1], runs, current)
+        else:
+            if current:
+                runs.append(''.join(current))
+                current.clear()
+    return runs
+
+
+def required_grams(query, use_regex=False, threshold=60):
+    """
+    Works out which trigrams a file must contain to possibly match the query.
+    Returns (grams, min_shared): a file is a candidate if it contains at least
+    min_shared of grams. Returns (set(), 0) when the query cannot narrow the search,
+    which is always the case for fuzzy queries.
+    """
+    if use_regex:
+        try:
+            parsed = sre_parse.parse(query)
+        except Exception:
+            return set(), 0
+        current = []
+        runs = _literal_runs(parsed, [], current)
+        runs.append(''.join(current))
+        grams = set()
+        for run in runs:
+            if len(run) >= GRAM_SIZE:
+                grams |= text_grams(run)
+        return grams, len(grams)
+
+    # Fuzzy: partial_ratio aligns the shorter string inside the longer one, so a line much
+    # shorter than the query (or one that differs in multi-byte characters) can score 100
+    # while sharing few or none of the query's trigrams. No trigram bound is sound here.
+    return set(), 0
+
+
+class TrigramIndex:
+    """
+    Persistent trigram posting lists for one directory tree, stored in SQLite.
+    Files are re-indexed only when their (size, mtime, inode) changes.
+    """
+
+    def __init__(self, directory, cache_dir=None):
+        self.directory = os.path.abspath(directory)
+        index_dir = os.path.join(cache_dir or default_cache_dir(), 'index')
+        os.makedirs(index_dir, exist_ok=True)
+        key = hashlib.sha1(self.directory.encode('utf-8')).hexdigest()
+        self.db_path = os.path.join(index_dir, f"{key}.sqlite")
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL, "
+            "size INTEGER, mtime_ns INTEGER, inode INTEGER, grams BLOB)"
+        )
+        self.conn.execute("CREATE TABLE IF NOT EXISTS postings (gram BLOB PRIMARY KEY, ids BLOB NOT NULL)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)")
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def refresh(self, entries, load_text, stop_event=None, text_limit=None):
+        """
+        Brings the index up to date with the given (path, stat_result) entries.
+        load_text(path) returns the searchable text of a file, or None if it should not be indexed.
+        text_limit is the size above which load_text gives up; when it grows, files skipped
+        as too large under the previous limit are indexed again.
+        Files missing from entries are dropped. Returns False if cancelled.
+        """
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'text_limit'").fetchone()
+        # Indexes built before the limit was recorded used the default 1 MB
+        previous_limit = row[0] if row else 1024 * 1024
+
+        known = {}
+        for file_id, path, size, mtime_ns, inode, unindexed in self.conn.execute(
+                "SELECT id, path, size, mtime_ns, inode, grams IS NULL FROM files"):
+            known[path] = (file_id, (size, mtime_ns, inode), unindexed)
+
+        added = defaultdict(set)
+        removed = defaultdict(set)
+        seen = set()
+
+        for path, st in entries:
+            if stop_event and stop_event.is_set():
+                self.conn.rollback()
+                return False
+
+            seen.add(path)
+            signature = (st.st_size, st.st_mtime_ns, st.st_ino)
+            row = known.get(path)
+            if row and row[1] == signature:
+                if not (row[2] and text_limit is not None and previous_limit < st.st_size <= text_limit):
+                    continue
+
+            if row:
+                file_id = row[0]
+                self._collect_grams(file_id, removed)
+            else:
+                file_id = self.conn.execute("INSERT INTO files (path) VALUES (?)", (path,)).lastrowid
+
+            text = load_text(path)
+            grams = text_grams(text) if text is not None else None
+            blob = b''.join(sorted(grams)) if grams is not None else None
+            self.conn.execute(
+                "UPDATE files SET size = ?, mtime_ns = ?, inode = ?, grams = ? WHERE id = ?",
+                (*signature, blob, file_id)
+            )
+            for gram in grams or ():
+                added[gram].add(file_id)
+
+        for path, (file_id, _, _) in known.items():
+            if path not in seen:
+                self._collect_grams(file_id, removed)
+                self.conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+        self._apply_postings(added, removed)
+        if text_limit is not None:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('text_limit', ?)", (text_limit,))
+        self.conn.commit()
+        return True
+
+    def _collect_grams(self, file_id, target):
+        row = self.conn.execute("SELECT grams FROM files WHERE id = ?", (file_id,)).fetchone()
+        if row and row[0]:
+            blob = row[0]
+            for i in range(0, len(blob), GRAM_SIZE):
+                target[blob[i:i + GRAM_SIZE]].add(file_id)
+
+    def _load_ids(self, gram):
+        row = self.conn.execute("SELECT ids FROM postings WHERE gram = ?", (gram,)).fetchone()
+        ids = array('q')
+        if row:
+            ids.frombytes(row[0])
+        return ids
+
+    def _apply_postings(self, added, removed):
+        for gram in set(added) | set(removed):
+            ids = set(self._load_ids(gram))
+            ids -= removed.get(gram, set())
+            ids |= added.get(gram, set())
+            if ids:
+                blob = array('q', sorted(ids)).tobytes()
+                self.conn.execute("INSERT OR REPLACE INTO postings (gram, ids) VALUES (?, ?)", (gram, blob))
+            else:
+                self.conn.execute("DELETE FROM postings WHERE gram = ?", (gram,))
+
+    def candidates(self, grams, min_shared):
+        """Returns the sorted paths of indexed text files containing at least min_shared of grams."""
+        if not grams or min_shared <= 0:
+            rows = self.conn.execute("SELECT path FROM files WHERE grams IS NOT NULL ORDER BY path")
+            return [path for (path,) in rows]
+
+        counts = Counter()
+        for gram in grams:
+            counts.update(self._load_ids(gram))
+        ids = [file_id for file_id, count in counts.items() if count >= min_shared]
+
+        paths = []
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.conn.execute(f"SELECT path FROM files WHERE id IN ({placeholders})", chunk)
+            paths.extend(path for (path,) in rows)
+        return sorted(paths)
+
+    def unindexed(self, min_size=0):
+        """Returns the sorted paths of files that were seen but hold no indexed text (binary, too large, Office)."""
+        rows = self.conn.execute("SELECT path FROM files WHERE grams IS NULL AND size > ? ORDER BY path", (min_size,))
+        return [path for (path,) in rows]